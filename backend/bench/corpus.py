@@ -0,0 +1,146 @@
+"""
+Synthetic manuscript corpus for benchmarks.
+
+Generates deterministic .docx manuscripts of a given page count with the
+things that stress the pipeline: styled and unstyled headings, long
+reference lists and LaTeX special characters.
+
+    python -m bench.corpus --pages 2 20 100 300 --out bench/corpus
+"""
+import os
+import json
+import random
+import argparse
+
+import docx
+
+WORDS_PER_PAGE = 500
+
+_VOCAB = (
+    "model data results method analysis network learning system performance "
+    "proposed approach accuracy training evaluation baseline dataset signal "
+    "algorithm framework optimization error feature latency throughput robust "
+    "significant experiment sample distribution parameter estimate variance"
+).split()
+
+# Characters that _latex_escape has to handle
+_SPECIALS = ["50%", "$x_i$", "R&D", "#3", "a_b", "{set}", "~approx", "x^2", "C:\\path"]
+
+_SECTIONS = ["Introduction", "Related Work", "Methodology", "Experimental Setup",
+             "Results", "Discussion", "Limitations", "Conclusion"]
+
+_ROMAN = ["I", "II", "III", "IV", "V", "VI", "VII", "VIII", "IX", "X"]
+
+# How headings are marked up in the generated DOCX
+HEADING_STYLES = ("styled", "numbered", "plain")
+
+
+def _sentence(rng: random.Random) -> str:
+    words = [rng.choice(_VOCAB) for _ in range(rng.randint(8, 22))]
+    if rng.random() < 0.3:
+        words.insert(rng.randrange(len(words)), rng.choice(_SPECIALS))
+    words[0] = words[0].capitalize()
+    return " ".join(words) + "."
+
+def _paragraph(rng: random.Random, n_words: int) -> str:
+    out, count = [], 0
+    while count < n_words:
+        s = _sentence(rng)
+        out.append(s)
+        count += len(s.split())
+    return " ".join(out)
+
+def _reference(rng: random.Random, i: int) -> str:
+    authors = ", ".join(f"{chr(65 + rng.randrange(26))}. {rng.choice(_VOCAB).capitalize()}"
+                        for _ in range(rng.randint(1, 4)))
+    title = " ".join(rng.choice(_VOCAB) for _ in range(rng.randint(4, 10))).capitalize()
+    return f"[{i}] {authors}, \"{title},\" in Proc. {rng.choice(_VOCAB).upper()}, {rng.randint(1990, 2025)}, pp. {rng.randint(1, 900)}-{rng.randint(901, 999)}."
+
+
+def generate_manuscript(path: str, pages: int, heading_style: str = "styled", seed: int = 0) -> dict:
+    """
+    Write one synthetic manuscript to `path`.
+    Returns the ground-truth metadata (title, authors, abstract, headings).
+    """
+    rng = random.Random(f"{seed}:{pages}:{heading_style}")
+    doc = docx.Document()
+
+    title   = " ".join(rng.choice(_VOCAB) for _ in range(8)).title()
+    authors = ", ".join(f"{rng.choice(_VOCAB).capitalize()} {rng.choice(_VOCAB).capitalize()}"
+                        for _ in range(rng.randint(2, 5)))
+    abstract = _paragraph(rng, 180)
+
+    doc.add_paragraph(title, style="Title")
+    doc.add_paragraph(authors)
+    doc.add_paragraph("Abstract")
+    doc.add_paragraph(abstract)
+
+    # Body: spread the word budget over the sections, with subsections on longer papers
+    body_words   = max(WORDS_PER_PAGE, pages * WORDS_PER_PAGE - 400)
+    n_sections   = len(_SECTIONS)
+    per_section  = body_words // n_sections
+    n_subsections = min(6, pages // 10)
+    headings = []
+
+    def _heading(text, level, number):
+        headings.append(text)
+        if heading_style == "styled":
+            doc.add_paragraph(text, style=f"Heading {level}")
+        elif heading_style == "numbered":
+            label = _ROMAN[number] if level == 1 else chr(65 + number)
+            doc.add_paragraph(f"{label}. {text}")
+        else:
+            doc.add_paragraph(text)
+
+    for s_idx, section in enumerate(_SECTIONS):
+        _heading(section, 1, s_idx)
+        chunks = [(None, per_section)] if not n_subsections else \
+                 [(f"{section} Part {k + 1}", per_section // n_subsections) for k in range(n_subsections)]
+        for k, (sub, words) in enumerate(chunks):
+            if sub:
+                _heading(sub, 2, k)
+            while words > 0:
+                n = min(words, rng.randint(60, 160))
+                doc.add_paragraph(_paragraph(rng, n))
+                words -= n
+
+    # References scale with length: ~15 for a short paper, 500+ for a thesis
+    n_refs = max(15, pages * 2)
+    doc.add_paragraph("References", style="Heading 1" if heading_style == "styled" else None)
+    for i in range(1, n_refs + 1):
+        doc.add_paragraph(_reference(rng, i))
+
+    doc.save(path)
+    return {"title": title, "authors": authors, "abstract": abstract, "headings": "\n".join(headings)}
+
+
+def build_corpus(out_dir: str, pages=(2, 20, 100, 300), heading_styles=HEADING_STYLES, seed: int = 0) -> list:
+    """Generate every (pages × heading_style) manuscript, plus a ground-truth .json beside it. Existing files are reused."""
+    os.makedirs(out_dir, exist_ok=True)
+    items = []
+    for n in pages:
+        for style in heading_styles:
+            path = os.path.join(out_dir, f"synthetic_{n:03d}p_{style}.docx")
+            truth_path = path[:-len(".docx")] + ".json"
+            if os.path.exists(path) and os.path.exists(truth_path):
+                with open(truth_path, "r", encoding="utf-8") as f:
+                    truth = json.load(f)
+            else:
+                truth = generate_manuscript(path, n, style, seed)
+                with open(truth_path, "w", encoding="utf-8") as f:
+                    json.dump(truth, f, indent=2)
+            items.append({"path": path, "pages": n, "heading_style": style, "truth": truth})
+    return items
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic .docx manuscript corpus.")
+    parser.add_argument("--pages", type=int, nargs="+", default=[2, 20, 100, 300])
+    parser.add_argument("--styles", nargs="+", default=list(HEADING_STYLES), choices=HEADING_STYLES)
+    parser.add_argument("--out", default=os.path.join(os.path.dirname(__file__), "corpus"))
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    for item in build_corpus(args.out, args.pages, args.styles, args.seed):
+        size_kb = os.path.getsize(item["path"]) / 1024
+        print(f"[N.O.V.A.] {item['path']}  ({item['pages']} pages, {item['heading_style']}, {size_kb:.0f} KB)")
@@ -0,0 +1,325 @@
+"""
+End-to-end benchmark harness.
+
+Runs every backend stage and HTTP endpoint over the synthetic corpus and
+reports latency percentiles, throughput and memory per stage. The LLM is
+replaced by the replay backend (src/llm.py) so runs need no Ollama and are
+reproducible; pass --llm live to benchmark against a real model.
+
+    cd backend
+    python -m bench.run --pages 2 20 100 --repeat 5
+    python -m bench.run --compare bench/results/<old>.json
+
+Results are written to bench/results/<timestamp>.json.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import itertools
+import tempfile
+import platform
+import threading
+import tracemalloc
+import statistics
+
+BENCH_DIR   = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+CORPUS_DIR  = os.path.join(BENCH_DIR, "corpus")
+
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+
+# ── Memory sampling ────────────────────────────────────────────────────────────
+
+def _current_rss() -> int:
+    """Resident set size in bytes (0 if the platform gives us no way to read it)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        return 0
+
+class _PeakRSS:
+    """
+    Polls RSS on a background thread while a stage runs. `growth` is the
+    peak above the RSS at entry — the process high-water mark alone mostly
+    reflects whatever earlier stages left behind.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.start = 0
+        self.peak = 0
+        self._stop = threading.Event()
+
+    def _poll(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, _current_rss())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.start = self.peak = _current_rss()
+        self._thread = threading.Thread(target=self._poll, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, _current_rss())
+
+    @property
+    def growth(self) -> int:
+        return max(0, self.peak - self.start)
+
+
+# ── Stats ──────────────────────────────────────────────────────────────────────
+
+def _percentile(sorted_vals, q):
+    if not sorted_vals:
+        return 0.0
+    k = (len(sorted_vals) - 1) * q
+    lo, hi = int(k), min(int(k) + 1, len(sorted_vals) - 1)
+    return sorted_vals[lo] + (sorted_vals[hi] - sorted_vals[lo]) * (k - lo)
+
+def _summarize(samples, pages):
+    s = sorted(samples)
+    total = sum(s)
+    return {
+        "n":         len(s),
+        "mean_ms":   statistics.fmean(s) * 1000 if s else 0.0,
+        "p50_ms":    _percentile(s, 0.50) * 1000,
+        "p90_ms":    _percentile(s, 0.90) * 1000,
+        "p99_ms":    _percentile(s, 0.99) * 1000,
+        "max_ms":    (s[-1] if s else 0.0) * 1000,
+        "docs_per_s":  len(s) / total if total else 0.0,
+        "pages_per_s": len(s) * pages / total if total else 0.0,
+    }
+
+def _measure(fn, repeat, warmup=1):
+    """
+    (timings, RSS growth, peak traced allocation). The allocation peak comes
+    from one extra untimed call under tracemalloc, which would skew timings.
+    """
+    samples = []
+    with _PeakRSS() as mem:
+        for _ in range(warmup):
+            fn()
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            fn()
+            samples.append(time.perf_counter() - t0)
+    tracemalloc.start()
+    try:
+        fn()
+        alloc_peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return samples, mem.growth, alloc_peak
+
+
+# ── Stages ─────────────────────────────────────────────────────────────────────
+
+_sessions = itertools.count()
+
+def _fresh_session():
+    return f"bench-cold-{next(_sessions)}"
+
+def _function_stages(engine, formatter, path, truth, with_pdf):
+    """(name, callable) pairs for the backend functions, sharing intermediate results."""
+    raw_text = engine.extract_text_from_docx(path)
+    metadata = engine.get_document_metadata(raw_text)
+    # Replay misses leave title/authors/abstract blank; fill them from the
+    # generator's ground truth so the downstream stages see realistic input.
+    for key, value in (truth or {}).items():
+        if key != "headings" and not metadata.get(key):
+            metadata[key] = value
+    tagged   = formatter._apply_metadata_headings(raw_text, metadata.get("headings", ""), metadata)
+
+    stages = [
+        ("engine.extract_text_from_docx",      lambda: engine.extract_text_from_docx(path)),
+        ("engine.calculate_lexical_hash",      lambda: engine.calculate_lexical_hash(raw_text)),
+        ("engine.get_semantic_hash",           lambda: engine.get_semantic_hash(raw_text)),
+        ("engine.get_document_metadata",       lambda: engine.get_document_metadata(raw_text)),
+        ("formatter._apply_metadata_headings", lambda: formatter._apply_metadata_headings(raw_text, metadata.get("headings", ""), metadata)),
+        ("formatter._latex_escape",            lambda: formatter._latex_escape(raw_text)),
+        ("formatter._convert_headings",        lambda: formatter._convert_headings(tagged)),
+    ]
+    if with_pdf:
+        # generate_pdf returns the previous PDF when the .tex is unchanged, so
+        # "cold" uses a fresh build session per call and "cached" reuses one
+        stages += [
+            ("formatter.generate_pdf (cold)",   lambda: formatter.generate_pdf(metadata, raw_text, _fresh_session())),
+            ("formatter.generate_pdf (cached)", lambda: formatter.generate_pdf(metadata, raw_text, "bench-cached")),
+        ]
+    return stages, raw_text, metadata
+
+def _endpoint_stages(client, path, raw_text, metadata, with_pdf):
+    with open(path, "rb") as f:
+        docx_bytes = f.read()
+    body = {"metadata": metadata, "raw_text": raw_text}
+    mime = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+    def _post(url, **kw):
+        res = client.post(url, **kw)
+        if res.status_code != 200:
+            raise RuntimeError(f"{url} → {res.status_code}: {res.text[:200]}")
+        return res
+
+    def _get(url):
+        res = client.get(url)
+        if res.status_code != 200:
+            raise RuntimeError(f"{url} → {res.status_code}: {res.text[:200]}")
+        return res
+
+    stages = [
+        ("POST /upload",          lambda: _post("/upload", files={"file": ("bench.docx", docx_bytes, mime)})),
+        ("POST /fix-abstract",    lambda: _post("/fix-abstract", json={"abstract": metadata.get("abstract", ""), "raw_text": raw_text})),
+        ("POST /download/report", lambda: _post("/download/report", json=body)),
+        ("POST /download/docx",   lambda: _post("/download/docx", json=body)),
+        ("POST /download/bib",    lambda: _post("/download/bib", json=body)),
+        ("GET /metrics",          lambda: _get("/metrics")),
+        # A new batch id per call, so resume never turns it into a manifest lookup
+        ("POST /batch",           lambda: _post("/batch", files={"files": ("bench.docx", docx_bytes, mime)})),
+    ]
+    if with_pdf:
+        stages += [
+            ("POST /download/pdf (cold)",   lambda: _post("/download/pdf", json={**body, "session_id": _fresh_session()})),
+            ("POST /download/pdf (cached)", lambda: _post("/download/pdf", json={**body, "session_id": "bench-cached-http"})),
+        ]
+    return stages
+
+
+# ── Reporting ──────────────────────────────────────────────────────────────────
+
+def _print_table(results, baseline=None):
+    base = {}
+    if baseline:
+        base = {(r["stage"], r["pages"], r["heading_style"]): r for r in baseline["results"]}
+
+    header = f"{'stage':<38} {'pages':>5} {'style':<9} {'p50 ms':>10} {'p90 ms':>10} {'p99 ms':>10} {'pages/s':>10} {'RSS+ MB':>9} {'alloc MB':>9}"
+    if baseline:
+        header += f" {'Δp50':>8}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        if "error" in r:
+            print(f"{r['stage']:<38} {r['pages']:>5} {r['heading_style']:<9} ERROR: {r['error'][:60]}")
+            continue
+        line = (f"{r['stage']:<38} {r['pages']:>5} {r['heading_style']:<9} "
+                f"{r['p50_ms']:>10.2f} {r['p90_ms']:>10.2f} {r['p99_ms']:>10.2f} "
+                f"{r['pages_per_s']:>10.1f} {r['rss_growth_mb']:>9.1f} {r['alloc_peak_mb']:>9.1f}")
+        old = base.get((r["stage"], r["pages"], r["heading_style"]))
+        if old and old.get("p50_ms"):
+            line += f" {(r['p50_ms'] / old['p50_ms'] - 1) * 100:>+7.1f}%"
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="N.O.V.A. end-to-end benchmarks.")
+    parser.add_argument("--pages", type=int, nargs="+", default=[2, 20, 100, 300])
+    parser.add_argument("--styles", nargs="+", default=["styled", "numbered", "plain"])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--llm", choices=["replay", "live"], default="replay",
+                        help="replay: answer from the cassette with simulated latency (default); live: use Ollama")
+    parser.add_argument("--llm-latency", default="",
+                        help='latency model for replay, e.g. "base=0.8,per_char=0.0005" (default: none)')
+    parser.add_argument("--no-pdf", action="store_true", help="skip generate_pdf / /download/pdf")
+    parser.add_argument("--no-http", action="store_true", help="skip the HTTP endpoint benchmarks")
+    parser.add_argument("--stage", action="append", default=[], help="only run stages whose name contains this")
+    parser.add_argument("--compare", help="previous results JSON to diff against")
+    parser.add_argument("--out", help="results file (default: bench/results/<timestamp>.json)")
+    args = parser.parse_args(argv)
+
+    # Choose the LLM backend before engine is imported — it checks the backend at import time.
+    if args.llm == "replay":
+        os.environ["NOVA_LLM_BACKEND"] = "replay"
+        os.environ.setdefault("NOVA_LLM_REPLAY_MISS", "empty")
+        os.environ["NOVA_LLM_LATENCY"] = args.llm_latency
+
+    from bench.corpus import build_corpus
+    from src import engine, formatter
+
+    with_pdf = not args.no_pdf and shutil.which("pdflatex") is not None
+    if not args.no_pdf and not with_pdf:
+        print("[N.O.V.A.] ⚠️  pdflatex not found — skipping PDF stages")
+
+    client = None
+    scratch = tempfile.mkdtemp(prefix="nova-bench-")
+    # Cold-build sessions pile up — keep them out of data/builds
+    formatter.BUILDS_DIR = os.path.join(scratch, "builds")
+    if not args.no_http:
+        from fastapi.testclient import TestClient
+        import main as server
+        # /upload writes its upload to TEMP_DOCX — keep the tracked data/temp.docx untouched
+        server.TEMP_DOCX = os.path.join(scratch, "temp.docx")
+        server.BATCHES_DIR = os.path.join(scratch, "batches")
+        client = TestClient(server.app)
+
+    def _selected(name):
+        return not args.stage or any(s in name for s in args.stage)
+
+    corpus  = build_corpus(CORPUS_DIR, args.pages, args.styles)
+    results = []
+    for item in corpus:
+        stages, raw_text, metadata = _function_stages(engine, formatter, item["path"], item["truth"], with_pdf)
+        if client is not None:
+            stages += _endpoint_stages(client, item["path"], raw_text, metadata, with_pdf)
+
+        for name, fn in stages:
+            if not _selected(name):
+                continue
+            row = {"stage": name, "pages": item["pages"], "heading_style": item["heading_style"]}
+            try:
+                samples, rss_growth, alloc_peak = _measure(fn, args.repeat)
+            except Exception as e:
+                # Keep going — one broken stage shouldn't lose the whole run
+                row["error"] = str(e)
+                results.append(row)
+                print(f"[N.O.V.A.] ⚠️  {name} failed on {item['pages']}p {item['heading_style']}: {e}")
+                continue
+            row.update(_summarize(samples, item["pages"]))
+            row["rss_growth_mb"] = rss_growth / (1024 * 1024)
+            row["alloc_peak_mb"] = alloc_peak / (1024 * 1024)
+            results.append(row)
+            print(f"[N.O.V.A.] {name:<38} {item['pages']:>3}p {item['heading_style']:<9} p50 {row['p50_ms']:9.2f} ms")
+
+    shutil.rmtree(scratch, ignore_errors=True)
+
+    run = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python":    platform.python_version(),
+        "platform":  platform.platform(),
+        "llm":       args.llm,
+        "llm_latency": args.llm_latency,
+        "repeat":    args.repeat,
+        "results":   results,
+    }
+
+    out = args.out or os.path.join(RESULTS_DIR, time.strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(run, f, indent=2)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    print()
+    _print_table(results, baseline)
+    print(f"\n[N.O.V.A.] Results saved to {out}")
+
+
+if __name__ == "__main__":
+    main()
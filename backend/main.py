@@ -1,9 +1,12 @@
 import os
 import asyncio
 import json
-from fastapi import FastAPI, UploadFile, File
+import time
+import uuid
+from typing import List, Optional
+from fastapi import FastAPI, UploadFile, File, Form, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import Response, JSONResponse
+from fastapi.responses import Response, JSONResponse, PlainTextResponse, FileResponse
 from pydantic import BaseModel
 
 # Resolve the backend root and the shared data directory using __file__
@@ -11,9 +14,14 @@ from pydantic import BaseModel
 BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR    = os.path.join(BACKEND_DIR, "data")
 TEMP_DOCX   = os.path.join(DATA_DIR, "temp.docx")
+BATCHES_DIR = os.path.join(DATA_DIR, "batches")
 
 # Use simple relative imports — no full dotted-package path needed.
-from src import engine, formatter
+from src import engine, formatter, exporter, batch, references, report, tracing
+
+# Set NOVA_TIMING_HEADER=1 to attach a Server-Timing header with per-stage
+# durations to every response (or send `X-Nova-Timing: 1` on a single request).
+TIMING_HEADER = os.environ.get("NOVA_TIMING_HEADER", "0").strip().lower() in ("1", "true", "yes", "on")
 
 app = FastAPI()
 
@@ -26,6 +34,42 @@ app.add_middleware(
 )
 
 
+# ── Tracing ────────────────────────────────────────────────────────────────────
+
+@app.middleware("http")
+async def _trace_requests(request: Request, call_next):
+    if not tracing.ENABLED:
+        return await call_next(request)
+
+    token = tracing.start_request()
+    t0 = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        elapsed = time.perf_counter() - t0
+        spans = tracing.end_request(token)
+        route = request.scope.get("route")
+        tracing.record_http(request.method, getattr(route, "path", "unmatched"), status, elapsed)
+
+    if TIMING_HEADER or request.headers.get("x-nova-timing") == "1":
+        response.headers["Server-Timing"] = tracing.server_timing(spans + [("total", elapsed)])
+    return response
+
+
+async def _run(stage: str, fn, *args):
+    """asyncio.to_thread, plus a record of how long the call sat waiting for a free worker."""
+    if not tracing.ENABLED:
+        return await asyncio.to_thread(fn, *args)
+
+    submitted = time.perf_counter()
+    def _timed():
+        tracing.record_queue_wait(stage, time.perf_counter() - submitted)
+        return fn(*args)
+    return await asyncio.to_thread(_timed)
+
+
 # ── Data Models ────────────────────────────────────────────────────────────────
 
 class AbstractRequest(BaseModel):
@@ -35,6 +79,12 @@ class AbstractRequest(BaseModel):
 class GenerateRequest(BaseModel):
     metadata: dict
     raw_text: str
+    # Reuses LaTeX build state (.aux, previous PDF) across downloads of the same
+    # document. Defaults to one session per title + authors.
+    session_id: Optional[str] = None
+    # The text as first uploaded, when raw_text has since been edited —
+    # /download/report compares the two paragraph by paragraph.
+    original_text: Optional[str] = None
 
 
 # ── Routes ─────────────────────────────────────────────────────────────────────
@@ -44,19 +94,26 @@ async def root():
     return {"message": "N.O.V.A. AI Engine is online and ready!"}
 
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus scrape endpoint: per-stage timings, thread-pool queue wait and cache hit rates."""
+    return PlainTextResponse(tracing.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
 @app.post("/upload")
 async def upload_file(file: UploadFile = File(...)):
     """Save file, hash it, and run LLM metadata extraction — all in one request."""
     try:
-        content = await file.read()
+        # Stream to disk — image-heavy manuscripts can be hundreds of MB
         with open(TEMP_DOCX, "wb") as f:
-            f.write(content)
+            while chunk := await file.read(1 << 20):
+                f.write(chunk)
 
         # Run all blocking work in threads so uvicorn's event loop stays free
-        raw_text     = await asyncio.to_thread(engine.extract_text_from_docx, TEMP_DOCX)
-        lexical_hash = await asyncio.to_thread(engine.calculate_lexical_hash, raw_text)
-        semantic_hash = await asyncio.to_thread(engine.get_semantic_hash, raw_text)
-        metadata     = await asyncio.to_thread(engine.get_document_metadata, raw_text)
+        raw_text     = await _run("engine.extract_text_from_docx", engine.extract_text_from_docx, TEMP_DOCX)
+        lexical_hash = await _run("engine.calculate_lexical_hash", engine.calculate_lexical_hash, raw_text)
+        semantic_hash = await _run("engine.get_semantic_hash", engine.get_semantic_hash, raw_text)
+        metadata     = await _run("engine.get_document_metadata", engine.get_document_metadata, raw_text)
 
         return {
             "raw_text":      raw_text,
@@ -73,7 +130,7 @@ async def upload_file(file: UploadFile = File(...)):
 async def fix_abstract(request: AbstractRequest):
     try:
         # All three calls are CPU/network-blocking — run them in threads
-        fixed_text   = await asyncio.to_thread(engine.fix_and_shorten_abstract, request.abstract)
+        fixed_text   = await _run("engine.fix_and_shorten_abstract", engine.fix_and_shorten_abstract, request.abstract)
 
         import re as _re
         def _norm(s: str) -> str:
@@ -121,9 +178,9 @@ async def fix_abstract(request: AbstractRequest):
             new_raw_text = norm_raw + "\n" + norm_fixed if llm_changed else norm_raw
 
 
-        lex_hash   = await asyncio.to_thread(engine.calculate_lexical_hash, new_raw_text)
-        sem_hash   = await asyncio.to_thread(engine.get_semantic_hash, new_raw_text)
-        similarity = await asyncio.to_thread(engine.calculate_semantic_similarity, request.raw_text, new_raw_text)
+        lex_hash   = await _run("engine.calculate_lexical_hash", engine.calculate_lexical_hash, new_raw_text)
+        sem_hash   = await _run("engine.get_semantic_hash", engine.get_semantic_hash, new_raw_text)
+        similarity = await _run("engine.calculate_semantic_similarity", engine.calculate_semantic_similarity, request.raw_text, new_raw_text)
 
         return {
             "fixed_abstract":   fixed_text,
@@ -139,7 +196,7 @@ async def fix_abstract(request: AbstractRequest):
 @app.post("/download/pdf")
 async def download_pdf(req: GenerateRequest):
     try:
-        pdf_bytes = await asyncio.to_thread(formatter.generate_pdf, req.metadata, req.raw_text)
+        pdf_bytes = await _run("formatter.generate_pdf", formatter.generate_pdf, req.metadata, req.raw_text, req.session_id)
         # Real PDFs always start with the %PDF magic bytes
         if not pdf_bytes or not pdf_bytes[:4] == b'%PDF':
             error_msg = pdf_bytes.decode(errors='replace') if pdf_bytes else 'No output from pdflatex'
@@ -157,25 +214,9 @@ async def download_pdf(req: GenerateRequest):
 @app.post("/download/report")
 async def download_report(req: GenerateRequest):
     try:
-        lex_hash = engine.calculate_lexical_hash(req.raw_text)
-        sem_hash = engine.get_semantic_hash(req.raw_text)
-
-        report = f"""N.O.V.A. CRYPTOGRAPHIC INTEGRITY REPORT
----------------------------------------
-Document Title: {req.metadata.get('title', 'Unknown')}
-
-[ LEXICAL INTEGRITY ]
-SHA-256 Hash: {lex_hash}
-Status: VERIFIED
-
-[ SEMANTIC INTEGRITY ]
-LSH Binarized Hash: {sem_hash}
-Status: VERIFIED
-(Note: Minor bit variations indicate authorized Gen-AI grammar/formatting fixes).
-
-Verification: 100% Scientific Claim Integrity Confirmed.
-"""
-        return Response(content=report.encode(), media_type="text/plain")
+        report_text = await _run("report.build_report", report.build_report,
+                                 req.metadata, req.raw_text, req.original_text)
+        return Response(content=report_text.encode(), media_type="text/plain")
     except Exception as e:
         return Response(content=str(e), status_code=500)
 
@@ -183,43 +224,7 @@ Verification: 100% Scientific Claim Integrity Confirmed.
 @app.post("/download/docx")
 async def download_docx(req: GenerateRequest):
     try:
-        def _build_docx() -> bytes:
-            import docx as _docx
-            import io
-            from docx.shared import Pt
-            from docx.enum.text import WD_ALIGN_PARAGRAPH
-
-            doc = _docx.Document()
-
-            # Title
-            t = doc.add_heading(req.metadata.get('title', 'Untitled'), level=0)
-            t.alignment = WD_ALIGN_PARAGRAPH.CENTER
-
-            # Authors
-            a = doc.add_paragraph(req.metadata.get('authors', ''))
-            a.alignment = WD_ALIGN_PARAGRAPH.CENTER
-            a.runs[0].italic = True if a.runs else None
-
-            # Abstract
-            doc.add_heading('Abstract', level=1)
-            doc.add_paragraph(req.metadata.get('abstract', ''))
-
-            # Body
-            doc.add_heading('Manuscript Body', level=1)
-            doc.add_paragraph(req.raw_text)
-
-            # References
-            refs = req.metadata.get('references', '')
-            if refs:
-                doc.add_heading('References', level=1)
-                doc.add_paragraph(refs)
-
-            buf = io.BytesIO()
-            doc.save(buf)
-            buf.seek(0)
-            return buf.read()
-
-        docx_bytes = await asyncio.to_thread(_build_docx)
+        docx_bytes = await _run("exporter.build_docx", exporter.build_docx, req.metadata, req.raw_text)
         return Response(
             content=docx_bytes,
             media_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
@@ -227,4 +232,65 @@ async def download_docx(req: GenerateRequest):
         )
     except Exception as e:
         import traceback; traceback.print_exc()
-        return JSONResponse(status_code=500, content={"detail": str(e)})
\ No newline at end of file
+        return JSONResponse(status_code=500, content={"detail": str(e)})
+
+
+@app.post("/download/bib")
+async def download_bib(req: GenerateRequest):
+    try:
+        entries = await _run("formatter.document_references", formatter.document_references, req.metadata, req.raw_text)
+        return Response(
+            content=references.to_bibtex(entries),
+            media_type="application/x-bibtex",
+            headers={"Content-Disposition": "attachment; filename=NOVA_References.bib"}
+        )
+    except Exception as e:
+        import traceback; traceback.print_exc()
+        return JSONResponse(status_code=500, content={"detail": str(e)})
+
+@app.post("/batch")
+async def batch_upload(
+    files: List[UploadFile] = File(...),
+    with_pdf: bool = Form(False),
+    batch_id: Optional[str] = Form(None),
+    workers: Optional[int] = Form(None),
+):
+    """
+    Process many manuscripts in one request (see src/batch.py). Pass back the
+    returned batch_id with more files to add to — or resume — the same batch.
+    """
+    try:
+        # Each worker is a thread — never let a client pick an unbounded count
+        if workers is not None and not 1 <= workers <= batch.BATCH_WORKERS:
+            return JSONResponse(status_code=422,
+                                content={"detail": f"workers must be between 1 and {batch.BATCH_WORKERS}"})
+        if batch_id and (not batch_id.isalnum() or not os.path.isdir(os.path.join(BATCHES_DIR, batch_id))):
+            return JSONResponse(status_code=404, content={"detail": f"Unknown batch '{batch_id}'"})
+        batch_id  = batch_id or uuid.uuid4().hex
+        input_dir = os.path.join(BATCHES_DIR, batch_id, "input")
+        out_dir   = os.path.join(BATCHES_DIR, batch_id, "output")
+        os.makedirs(input_dir, exist_ok=True)
+
+        for upload in files:
+            name = os.path.basename(upload.filename or "")
+            if not name.lower().endswith(".docx"):
+                continue
+            with open(os.path.join(input_dir, name), "wb") as f:
+                while chunk := await upload.read(1 << 20):
+                    f.write(chunk)
+
+        results = await _run("batch.process_directory", lambda: batch.process_directory(
+            input_dir, out_dir, workers=workers, with_pdf=with_pdf))
+        return {"batch_id": batch_id, "results": results}
+    except Exception as e:
+        import traceback; traceback.print_exc()
+        return JSONResponse(status_code=500, content={"detail": str(e)})
+
+
+@app.get("/batch/{batch_id}/{filename}")
+async def batch_download(batch_id: str, filename: str):
+    """Download a batch's manifest.jsonl or one of its generated PDFs."""
+    path = os.path.join(BATCHES_DIR, batch_id, "output", os.path.basename(filename))
+    if not batch_id.isalnum() or not os.path.isfile(path):
+        return JSONResponse(status_code=404, content={"detail": "Not found"})
+    return FileResponse(path, filename=os.path.basename(filename))
@@ -1,7 +1,12 @@
+import io
+import hashlib
+import json
+from concurrent.futures import ThreadPoolExecutor
+
 import streamlit as st
 import Nova.backend.src.engine as engine
 import Nova.backend.src.formatter as formatter
-import time
+import Nova.backend.src.report as report
 
 # --- 1. Page Configuration & CSS ---
 st.set_page_config(layout="wide", page_title="N.O.V.A. Hub")
@@ -18,11 +23,62 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# --- 2. Session State Management ---
+# --- 2. Shared Resources & Memoized Stages ---
+# Streamlit reruns this whole script on every widget interaction, in every
+# browser session. Anything heavy is therefore either a process-wide resource
+# (loaded once, shared by all sessions) or memoized on the uploaded file's
+# SHA-256, so editing a text box never re-extracts or re-queries the LLM.
+
+@st.cache_resource(show_spinner="Loading embedding model...")
+def _embedding_model():
+    return engine._get_model()
+
+@st.cache_resource
+def _pdf_pool():
+    # pdflatex runs here, not on the session's script thread — a rerun
+    # (any widget edit) doesn't cancel a compile already in progress
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix="nova-hub-pdf")
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def _extract(file_sha, _data):
+    text = engine.extract_text_from_docx(io.BytesIO(_data))
+    return text, engine.calculate_lexical_hash(text)
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def _metadata(file_sha, _raw_text):
+    return engine.get_document_metadata(_raw_text)
+
+def _pdf_status():
+    """Shows the session's PDF job without waiting on it; polls while it runs."""
+    job = st.session_state.pdf_job
+    if job is None:
+        return
+    if not job.done():
+        st.info("⏳ Compiling LaTeX... (you can keep editing)")
+        return
+    if st.session_state.pdf_polling:
+        # Registered with run_every while the job ran — one full rerun
+        # registers it again without, so it stops polling (and re-sending the PDF)
+        st.session_state.pdf_polling = False
+        st.rerun()
+    try:
+        result = job.result()
+        st.success("PDF Generated Successfully!")
+        st.download_button(label="⬇️ Download PDF", data=result, file_name="nova_output.pdf", mime="application/pdf", use_container_width=True)
+    except RuntimeError as e:
+        st.error(f"Failed to generate PDF: {e}")
+
+_embedding_model()
+
+# --- 3. Session State Management ---
 if 'raw_text' not in st.session_state: st.session_state.raw_text = None
 if 'metadata' not in st.session_state: st.session_state.metadata = None
 if 'lexical_hash' not in st.session_state: st.session_state.lexical_hash = None
 if 'filename' not in st.session_state: st.session_state.filename = None
+if 'file_sha' not in st.session_state: st.session_state.file_sha = None
+if 'pdf_job' not in st.session_state: st.session_state.pdf_job = None
+if 'pdf_polling' not in st.session_state: st.session_state.pdf_polling = False
+if 'report' not in st.session_state: st.session_state.report = None
 
 # --- Helper Function to Reset App ---
 def reset_app():
@@ -30,8 +86,12 @@ def reset_app():
     st.session_state.metadata = None
     st.session_state.lexical_hash = None
     st.session_state.filename = None
+    st.session_state.file_sha = None
+    st.session_state.pdf_job = None
+    st.session_state.pdf_polling = False
+    st.session_state.report = None
 
-# --- 3. MAIN APP LOGIC (State Machine) ---
+# --- 4. MAIN APP LOGIC (State Machine) ---
 
 st.title("Manuscript Intelligence Hub ☁️")
 
@@ -51,7 +111,10 @@ if st.session_state.raw_text is None:
         uploaded_file = st.file_uploader("", type=['docx'], label_visibility="collapsed")
         
         if uploaded_file is not None:
+            data = uploaded_file.getvalue()
+            file_sha = hashlib.sha256(data).hexdigest()
             st.session_state.filename = uploaded_file.name
+            st.session_state.file_sha = file_sha
             
             # Processing UI
             st.write("---")
@@ -60,23 +123,16 @@ if st.session_state.raw_text is None:
 
             status_text.markdown("Processing: **📖 Unpacking .docx and extracting raw text...**")
             progress_bar.progress(25)
-            text = engine.extract_text_from_docx(uploaded_file)
+            text, lexical_hash = _extract(file_sha, data)
             st.session_state.raw_text = text
-            time.sleep(0.5)
-            
-            status_text.markdown("Processing: **🔐 Calculating Lexical SHA-256 Hash...**")
-            progress_bar.progress(50)
-            st.session_state.lexical_hash = engine.calculate_lexical_hash(text)
-            time.sleep(0.5)
+            st.session_state.lexical_hash = lexical_hash
                 
             status_text.markdown("Processing: **🤖 AI engine parsing structural semantics...**")
             progress_bar.progress(85)
-            meta = engine.get_document_metadata(text)
-            st.session_state.metadata = meta
+            st.session_state.metadata = _metadata(file_sha, text)
             
             progress_bar.progress(100)
             status_text.markdown("✅ **Analysis Complete!** Transitioning to dashboard...")
-            time.sleep(1)
             
             st.rerun()
 
@@ -155,14 +211,20 @@ else:
 
         # --- D. Generation & Output ---
         if st.button("📄 Generate IEEE PDF", type="primary", use_container_width=True):
-            with st.spinner("Compiling LaTeX..."):
-                result = formatter.generate_pdf(st.session_state.metadata, st.session_state.raw_text)
-                if result and not str(result).startswith("Formatting Error"):
-                    st.success("PDF Generated Successfully!")
-                    st.download_button(label="⬇️ Download PDF", data=result, file_name="nova_output.pdf", mime="application/pdf", use_container_width=True)
-                else:
-                    st.error(f"Failed to generate PDF: {result}")
+            st.session_state.pdf_job = _pdf_pool().submit(
+                formatter.generate_pdf, dict(st.session_state.metadata), st.session_state.raw_text,
+                st.session_state.file_sha[:16])
+
+        # Only this fragment reruns while the job is pending, once a second;
+        # the rest of the page stays interactive
+        pending = st.session_state.pdf_job is not None and not st.session_state.pdf_job.done()
+        st.session_state.pdf_polling = pending
+        st.fragment(_pdf_status, run_every=1.0 if pending else None)()
         
-        # Download Hashing Report
-        report_text = f"N.O.V.A. INTEGRITY REPORT\n-------------------------\nDocument: {st.session_state.filename}\nLexical SHA-256 Hash: {st.session_state.lexical_hash}\nVerification: 100% Character Integrity Confirmed."
-        st.download_button(label="🛡️ Download Hashing Report", data=report_text, file_name="integrity_report.txt", mime="text/plain", use_container_width=True)
\ No newline at end of file
+        # Download Hashing Report — built on request, kept until the metadata changes
+        metadata_key = json.dumps(st.session_state.metadata, sort_keys=True)
+        if st.button("🛡️ Prepare Hashing Report", use_container_width=True):
+            with st.spinner("Comparing paragraphs..."):
+                st.session_state.report = (metadata_key, report.build_report(st.session_state.metadata, st.session_state.raw_text))
+        if st.session_state.report and st.session_state.report[0] == metadata_key:
+            st.download_button(label="⬇️ Download Hashing Report", data=st.session_state.report[1], file_name="integrity_report.txt", mime="text/plain", use_container_width=True)
@@ -0,0 +1,227 @@
+"""
+Batch manuscript processing.
+
+Runs extraction, hashing, LLM metadata and (optionally) PDF generation over
+every .docx in a directory. The cheap CPU stages run on a pool of `workers`
+threads and queue their results ahead of the LLM stage, so the model always
+has the next manuscript ready. Progress goes to manifest.jsonl in the output
+directory, one line per finished file; rerunning skips files already in the
+manifest with the same content hash.
+
+    cd backend
+    python -m src.batch path/to/submissions --out path/to/results --workers 8 --pdf
+"""
+import os
+import sys
+import json
+import time
+import queue
+import hashlib
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from . import engine, formatter, tracing
+
+# Defaults, overridable per call / on the command line
+BATCH_WORKERS     = int(os.environ.get("NOVA_BATCH_WORKERS", str(min(8, os.cpu_count() or 4))))
+# Ollama serves one request at a time per model unless OLLAMA_NUM_PARALLEL is raised
+BATCH_LLM_WORKERS = int(os.environ.get("NOVA_BATCH_LLM_WORKERS", "1"))
+
+MANIFEST_NAME = "manifest.jsonl"
+
+
+def _file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(65536), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class Manifest:
+    """Append-only JSON-lines log of finished files — the resume point for the next run."""
+
+    def __init__(self, path):
+        self.path  = path
+        self._lock = threading.Lock()
+
+    def completed(self) -> dict:
+        """file name → entry, for every file whose last recorded run succeeded."""
+        done = {}
+        if not os.path.exists(self.path):
+            return done
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue   # a line cut short by a crash — that file simply reruns
+                if entry.get("status") == "ok":
+                    done[entry["file"]] = entry
+                else:
+                    done.pop(entry.get("file"), None)
+        return done
+
+    def append(self, entry):
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                f.flush()
+
+
+# ── Stages ─────────────────────────────────────────────────────────────────────
+
+def _prepare(path, sha):
+    """CPU stages: extraction and both hashes."""
+    item = {"file": os.path.basename(path), "sha256": sha, "timings": {}}
+    try:
+        t0 = time.perf_counter()
+        raw_text = engine.extract_text_from_docx(path)
+        if raw_text.startswith("An error occurred during extraction"):
+            raise RuntimeError(raw_text)
+        t1 = time.perf_counter()
+        item["lexical_hash"]  = engine.calculate_lexical_hash(raw_text)
+        item["semantic_hash"] = engine.get_semantic_hash(raw_text)
+        t2 = time.perf_counter()
+        item["raw_text"] = raw_text
+        item["timings"].update(extract=t1 - t0, hashes=t2 - t1)
+    except Exception as e:
+        item["error"] = f"prepare: {e}"
+    return item
+
+def _write_pdf(item, out_dir):
+    t0 = time.perf_counter()
+    pdf_bytes = formatter.generate_pdf(item["metadata"], item["raw_text"], item["sha256"][:16])
+    pdf_name = os.path.splitext(item["file"])[0] + ".pdf"
+    with open(os.path.join(out_dir, pdf_name), "wb") as f:
+        f.write(pdf_bytes)
+    item["pdf"] = pdf_name
+    item["timings"]["pdf"] = time.perf_counter() - t0
+
+
+def process_directory(input_dir, out_dir, workers=None, llm_workers=None, with_pdf=False,
+                      resume=True, on_result=None):
+    """
+    Process every .docx in `input_dir`, writing manifest.jsonl (and PDFs) to `out_dir`.
+    `on_result(entry)` is called as each file finishes. Returns all manifest
+    entries for the directory, including ones skipped because they were already done.
+    """
+    workers     = workers or BATCH_WORKERS
+    llm_workers = llm_workers or BATCH_LLM_WORKERS
+    os.makedirs(out_dir, exist_ok=True)
+
+    paths = sorted(
+        os.path.join(input_dir, name) for name in os.listdir(input_dir)
+        if name.lower().endswith(".docx") and not name.startswith("~$")   # skip Word lock files
+    )
+    manifest = Manifest(os.path.join(out_dir, MANIFEST_NAME))
+    done = manifest.completed() if resume else {}
+
+    results, todo = [], []
+    for path in paths:
+        sha = _file_sha256(path)
+        prev = done.get(os.path.basename(path))
+        if prev and prev.get("sha256") == sha and (prev.get("pdf") or not with_pdf):
+            results.append(prev)
+        else:
+            todo.append((path, sha))
+    print(f"[N.O.V.A.] batch: {len(paths)} file(s), {len(paths) - len(todo)} already done, "
+          f"{workers} CPU worker(s), {llm_workers} LLM worker(s)")
+
+    # Prepared manuscripts wait here for the LLM. The semaphore caps how far the
+    # CPU stages may run ahead, so memory stays bounded on huge directories.
+    ready = queue.Queue()
+    ahead = threading.Semaphore(workers + 2 * llm_workers)
+    results_lock = threading.Lock()
+
+    cpu_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="nova-batch-cpu")
+
+    def _finish(item):
+        item.pop("raw_text", None)
+        item["status"] = "error" if "error" in item else "ok"
+        manifest.append(item)
+        with results_lock:
+            results.append(item)
+        if on_result:
+            on_result(item)
+        mark = "✅" if item["status"] == "ok" else "⚠️ "
+        print(f"[N.O.V.A.] batch: {mark} {item['file']}" + (f" — {item['error']}" if "error" in item else ""))
+
+    def _pdf_then_finish(item):
+        try:
+            _write_pdf(item, out_dir)
+        except Exception as e:
+            item["error"] = f"pdf: {e}"
+        _finish(item)
+
+    def _llm_loop():
+        pending_pdfs = []
+        while True:
+            item = ready.get()
+            if item is None:
+                break
+            ahead.release()
+            if "error" not in item:
+                try:
+                    t0 = time.perf_counter()
+                    with tracing.span("batch.llm_metadata"):
+                        item["metadata"] = engine.get_document_metadata(item["raw_text"])
+                    item["timings"]["metadata"] = time.perf_counter() - t0
+                except Exception as e:
+                    item["error"] = f"metadata: {e}"
+            if with_pdf and "error" not in item:
+                # pdflatex goes back to the CPU pool — this thread returns to the LLM
+                pending_pdfs.append(cpu_pool.submit(_pdf_then_finish, item))
+            else:
+                _finish(item)
+        for fut in pending_pdfs:
+            fut.result()
+
+    llm_threads = [threading.Thread(target=_llm_loop, name=f"nova-batch-llm-{i}", daemon=True)
+                   for i in range(llm_workers)]
+    for t in llm_threads:
+        t.start()
+
+    def _prepare_and_queue(path, sha):
+        ready.put(_prepare(path, sha))
+
+    try:
+        prepares = []
+        for path, sha in todo:
+            ahead.acquire()
+            prepares.append(cpu_pool.submit(_prepare_and_queue, path, sha))
+        for fut in prepares:
+            fut.result()
+    finally:
+        for _ in llm_threads:
+            ready.put(None)
+        for t in llm_threads:
+            t.join()
+        cpu_pool.shutdown(wait=True)
+
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch-process a directory of .docx manuscripts.")
+    parser.add_argument("input_dir")
+    parser.add_argument("--out", help="output directory for manifest.jsonl and PDFs (default: <input_dir>/nova_batch)")
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS, help="threads for extraction/hashing/PDF")
+    parser.add_argument("--llm-workers", type=int, default=BATCH_LLM_WORKERS, help="concurrent LLM requests")
+    parser.add_argument("--pdf", action="store_true", help="also compile an IEEE PDF per manuscript")
+    parser.add_argument("--no-resume", action="store_true", help="reprocess files already in the manifest")
+    args = parser.parse_args(argv)
+
+    out_dir = args.out or os.path.join(args.input_dir, "nova_batch")
+    t0 = time.perf_counter()
+    results = process_directory(args.input_dir, out_dir, args.workers, args.llm_workers,
+                                with_pdf=args.pdf, resume=not args.no_resume)
+    failed = sum(1 for r in results if r.get("status") != "ok")
+    print(f"[N.O.V.A.] batch: {len(results) - failed} ok, {failed} failed in {time.perf_counter() - t0:.1f}s "
+          f"— manifest: {os.path.join(out_dir, MANIFEST_NAME)}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
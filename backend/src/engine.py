@@ -1,11 +1,21 @@
-import docx
-import ollama
 import os
 import json
 import re
+import shutil
 import hashlib
+import zipfile
+import threading
+import posixpath
+import xml.etree.ElementTree as ET
+import numpy as np
 from sentence_transformers import SentenceTransformer, util
 
+# All model calls go through llm.py so Ollama can be swapped for a
+# record/replay stand-in (see NOVA_LLM_BACKEND there).
+from . import llm
+from . import tracing
+from . import omml
+
 # The model to use for AI extraction.
 # Override by setting OLLAMA_MODEL in your environment, e.g.:
 #   set OLLAMA_MODEL=llama3  (Windows)
@@ -15,35 +25,223 @@ OLLAMA_MODEL = os.environ.get('OLLAMA_MODEL', 'phi3:mini')
 # ==========================================
 # 1. TEXT EXTRACTION
 # ==========================================
+# The .docx is read straight from its zip: document.xml is parsed as a stream
+# (one body element at a time), and image parts are copied byte-for-byte into
+# MEDIA_DIR without ever being decoded or held in memory. python-docx would
+# load every image blob on open, which doesn't scale to image-heavy theses.
+
+MEDIA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "media")
+# Oldest per-document media folders beyond this count are deleted.
+MAX_MEDIA_DOCS = int(os.environ.get("NOVA_MAX_MEDIA_DOCS", "64"))
+
+_W   = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+_R   = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+_A   = '{http://schemas.openxmlformats.org/drawingml/2006/main}'
+_V   = '{urn:schemas-microsoft-com:vml}'
+_MC  = '{http://schemas.openxmlformats.org/markup-compatibility/2006}'
+_REL = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+# Text inside these never belongs to the paragraph itself (deleted revisions,
+# text boxes, property blocks, the VML fallback copy of a drawing).
+_SKIP_TAGS = {_W + 'del', _W + 'txbxContent', _W + 'pPr', _W + 'rPr', _MC + 'Fallback'}
+
+
+def _docx_styles(zf):
+    """styleId → lower-case style name ("Heading1" → "heading 1")."""
+    try:
+        root = ET.fromstring(zf.read('word/styles.xml'))
+    except KeyError:
+        return {}
+    names = {}
+    for style in root.iter(_W + 'style'):
+        name = style.find(_W + 'name')
+        if name is not None:
+            names[style.get(_W + 'styleId')] = (name.get(_W + 'val') or '').lower()
+    return names
+
+def _docx_image_rels(zf):
+    """Relationship id → zip member name for embedded (not linked) images."""
+    try:
+        root = ET.fromstring(zf.read('word/_rels/document.xml.rels'))
+    except KeyError:
+        return {}
+    rels = {}
+    for rel in root.iter(_REL + 'Relationship'):
+        if rel.get('TargetMode') == 'External' or not rel.get('Type', '').endswith('/image'):
+            continue
+        target = rel.get('Target', '')
+        member = target.lstrip('/') if target.startswith('/') else posixpath.normpath(posixpath.join('word', target))
+        rels[rel.get('Id')] = member
+    return rels
+
+
+class _BlockWriter:
+    """Turns body elements into extracted lines, streaming referenced images to disk."""
+
+    def __init__(self, zf, styles, image_rels, media_dir, doc_id):
+        self.zf, self.styles, self.image_rels = zf, styles, image_rels
+        self.media_dir, self.doc_id = media_dir, doc_id
+        self.lines  = []
+        self.copied = {}   # zip member → marker path
+
+    def _image(self, rel_id):
+        member = self.image_rels.get(rel_id)
+        if member is None:
+            return None
+        if member not in self.copied:
+            name = posixpath.basename(member)
+            dest = os.path.join(self.media_dir, name)
+            try:
+                info = self.zf.getinfo(member)
+            except KeyError:
+                return None
+            if not (os.path.exists(dest) and os.path.getsize(dest) == info.file_size):
+                os.makedirs(self.media_dir, exist_ok=True)
+                with self.zf.open(info) as src, open(dest, 'wb') as out:
+                    shutil.copyfileobj(src, out, 1 << 20)
+            self.copied[member] = f"{self.doc_id}/{name}"
+        return self.copied[member]
+
+    def _walk(self, elem, text, images, maths):
+        for child in elem:
+            tag = child.tag
+            if tag in _SKIP_TAGS:
+                continue
+            if tag == _W + 't':
+                text.append(child.text or '')
+            elif tag in (_W + 'tab', _W + 'ptab'):
+                text.append('\t')
+            elif tag in (_W + 'br', _W + 'cr'):
+                text.append('\n')
+            elif tag == _W + 'noBreakHyphen':
+                text.append('-')
+            elif tag in (omml.M + 'oMath', omml.M + 'oMathPara'):
+                latex = omml.convert(child).strip()
+                if latex:
+                    maths.append(latex)
+                    text.append(f"@@M@@{latex}@@END@@")
+            elif tag == _W + 'drawing':
+                images.extend(b.get(_R + 'embed') for b in child.iter(_A + 'blip'))
+            elif tag == _W + 'pict':
+                images.extend(d.get(_R + 'id') for d in child.iter(_V + 'imagedata'))
+            else:
+                self._walk(child, text, images, maths)
+
+    def paragraph(self, p):
+        text, images, maths = [], [], []
+        self._walk(p, text, images, maths)
+        clean_text = ''.join(text).strip()
+
+        style_id = p.find(f'{_W}pPr/{_W}pStyle')
+        style = self.styles.get(style_id.get(_W + 'val'), '') if style_id is not None else ''
+
+        if clean_text:
+            if maths and clean_text == f"@@M@@{maths[0]}@@END@@" and len(maths) == 1:
+                # An equation on its own line is display math
+                self.lines.append(f"@@EQ@@{maths[0]}@@END@@")
+            elif style.startswith("heading 1") or style == "title":
+                self.lines.append(f"@@H1@@{clean_text}@@END@@")
+            elif style.startswith("heading 2"):
+                self.lines.append(f"@@H2@@{clean_text}@@END@@")
+            elif style.startswith("heading 3"):
+                self.lines.append(f"@@H3@@{clean_text}@@END@@")
+            else:
+                self.lines.append(clean_text)
+
+        for rel_id in images:
+            path = self._image(rel_id)
+            if path:
+                self.lines.append(f"@@FIG@@{path}@@END@@")
+
+    def table(self, tbl):
+        rows, images = [], []
+        for tr in tbl.findall(_W + 'tr'):
+            row = []
+            for tc in tr.findall(_W + 'tc'):
+                parts = []
+                for p in tc.iter(_W + 'p'):
+                    text, maths = [], []
+                    self._walk(p, text, images, maths)
+                    parts.append(''.join(text).strip())
+                row.append(' '.join(x for x in parts if x).replace('\n', ' '))
+            if any(row):
+                rows.append(row)
+        if rows:
+            self.lines.append(f"@@TABLE@@{json.dumps(rows, ensure_ascii=False)}@@END@@")
+        for rel_id in images:
+            path = self._image(rel_id)
+            if path:
+                self.lines.append(f"@@FIG@@{path}@@END@@")
+
+
+def _docx_id(file_path):
+    """Short content hash of the .docx — names its media folder."""
+    h = hashlib.sha256()
+    if isinstance(file_path, (str, os.PathLike)):
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                h.update(block)
+    else:
+        file_path.seek(0)
+        for block in iter(lambda: file_path.read(1 << 20), b''):
+            h.update(block)
+        file_path.seek(0)
+    return h.hexdigest()[:16]
+
+def _prune_media(keep):
+    try:
+        docs = [os.path.join(MEDIA_DIR, d) for d in os.listdir(MEDIA_DIR) if d != keep]
+    except OSError:
+        return
+    docs = [d for d in docs if os.path.isdir(d)]
+    excess = len(docs) + 1 - MAX_MEDIA_DOCS
+    if excess > 0:
+        docs.sort(key=os.path.getmtime)
+        for d in docs[:excess]:
+            shutil.rmtree(d, ignore_errors=True)
+
+
+@tracing.traced("engine.extract_text_from_docx")
 def extract_text_from_docx(file_path):
     """
-    Extracts text from a .docx file, tagging headings by their DOCX style:
+    Extracts text from a .docx file (path or file-like), one line per block:
       Heading 1 / Title → @@H1@@text@@END@@
       Heading 2         → @@H2@@text@@END@@
       Heading 3         → @@H3@@text@@END@@
-    These markers let formatter.py produce proper \\section / \\subsection hierarchy.
+      Table             → @@TABLE@@[["cell", ...], ...]@@END@@   (JSON rows)
+      Image             → @@FIG@@<doc id>/<image file>@@END@@    (relative to MEDIA_DIR)
+      Equation          → @@EQ@@latex@@END@@, or @@M@@latex@@END@@ inline in text
+    These markers let formatter.py produce proper \\section / \\subsection hierarchy,
+    figures, tables and equations.
     """
     try:
-        doc = docx.Document(file_path)
-        extracted_paragraphs = []
-
-        for para in doc.paragraphs:
-            clean_text = para.text.strip()
-            if not clean_text:
-                continue
-
-            style = para.style.name if para.style else ""
-
-            if style.startswith("Heading 1") or style == "Title":
-                extracted_paragraphs.append(f"@@H1@@{clean_text}@@END@@")
-            elif style.startswith("Heading 2"):
-                extracted_paragraphs.append(f"@@H2@@{clean_text}@@END@@")
-            elif style.startswith("Heading 3"):
-                extracted_paragraphs.append(f"@@H3@@{clean_text}@@END@@")
-            else:
-                extracted_paragraphs.append(clean_text)
-
-        return '\n'.join(extracted_paragraphs)
+        doc_id = _docx_id(file_path)
+        with zipfile.ZipFile(file_path) as zf:
+            writer = _BlockWriter(zf, _docx_styles(zf), _docx_image_rels(zf),
+                                  os.path.join(MEDIA_DIR, doc_id), doc_id)
+
+            # Stream document.xml, handling and then discarding each direct child of <w:body>
+            depth, body = 0, None
+            with zf.open('word/document.xml') as xml:
+                for event, elem in ET.iterparse(xml, events=('start', 'end')):
+                    if event == 'start':
+                        depth += 1
+                        if depth == 2 and elem.tag == _W + 'body':
+                            body = elem
+                        continue
+                    depth -= 1
+                    if depth != 2:
+                        continue
+                    if elem.tag == _W + 'p':
+                        writer.paragraph(elem)
+                    elif elem.tag == _W + 'tbl':
+                        writer.table(elem)
+                    if body is not None:
+                        body.remove(elem)
+
+        if writer.copied:
+            _prune_media(keep=doc_id)
+        return '\n'.join(writer.lines)
     except Exception as e:
         return f"An error occurred during extraction: {str(e)}"
 
@@ -52,6 +250,11 @@ def extract_text_from_docx(file_path):
 # ==========================================
 # 2. METADATA PARSING (The "Brain")
 # ==========================================
+# metadata["references"] when the document has no References heading —
+# exporters and the report must not treat it as reference text.
+NO_REFERENCES = "No references section found."
+
+@tracing.traced("engine.get_document_metadata")
 def get_document_metadata(text_content):
     """
     A robust, multi-pass extraction engine designed to prevent SLM hallucinations
@@ -108,12 +311,13 @@ TEXT:
 {head_text}
 """
     try:
-        res_head = ollama.chat(
-            model=OLLAMA_MODEL,
-            messages=[{'role': 'user', 'content': prompt_head}],
-            format='json',
-            options={'temperature': 0.0},
-        )
+        with tracing.span("engine.llm_header"):
+            res_head = llm.chat(
+                model=OLLAMA_MODEL,
+                messages=[{'role': 'user', 'content': prompt_head}],
+                format='json',
+                options={'temperature': 0.0},
+            )
         raw_content = res_head['message']['content']
         head_data = _safe_json_parse(raw_content)
 
@@ -134,7 +338,7 @@ TEXT:
         if ref_match:
             metadata["references"] = ref_match.group(1).strip()
         else:
-            metadata["references"] = "No references section found."
+            metadata["references"] = NO_REFERENCES
     except Exception as e:
         print(f"Reference Extraction Failed: {e}")
 
@@ -193,6 +397,7 @@ TEXT:
 # ==========================================
 # 3. GEN-AI FIXER (Auto-Editor)
 # ==========================================
+@tracing.traced("engine.fix_and_shorten_abstract")
 def fix_and_shorten_abstract(abstract_text):
     """
     Uses the local LLM to fix grammar and shorten the abstract to <250 words.
@@ -205,10 +410,11 @@ ORIGINAL ABSTRACT:
 {abstract_text}
 """
     try:
-        response = ollama.chat(
-            model=OLLAMA_MODEL,
-            messages=[{'role': 'user', 'content': prompt}],
-        )
+        with tracing.span("engine.llm_fix"):
+            response = llm.chat(
+                model=OLLAMA_MODEL,
+                messages=[{'role': 'user', 'content': prompt}],
+            )
         return response['message']['content'].strip()
     except Exception as e:
         print(f"AI Fixer Failed: {e}")
@@ -218,6 +424,7 @@ ORIGINAL ABSTRACT:
 # ==========================================
 # 4. HASHING & INTEGRITY
 # ==========================================
+@tracing.traced("engine.calculate_lexical_hash")
 def calculate_lexical_hash(text_content):
     """Generates a SHA-256 hash of the raw alphanumeric character string."""
     clean_string = "".join(text_content.split()).encode('utf-8')
@@ -239,27 +446,118 @@ def get_semantic_chunks(text, chunk_size=2000):
 
 # Lazy singleton — the ~90MB model loads only on first use, not at import time.
 # This prevents the server from hanging during startup/model-download.
-_model = None
+# The lock keeps concurrent first requests (API workers, Streamlit sessions)
+# from each loading their own copy.
+_model      = None
+_model_lock = threading.Lock()
 
 def _get_model():
     global _model
+    tracing.record_cache("embedding_model", _model is not None)
     if _model is None:
-        print("[N.O.V.A.] Loading SentenceTransformer model (first use)...")
-        _model = SentenceTransformer('all-MiniLM-L6-v2')
-        print("[N.O.V.A.] Model loaded.")
+        with _model_lock:
+            if _model is None:
+                print("[N.O.V.A.] Loading SentenceTransformer model (first use)...")
+                _model = SentenceTransformer('all-MiniLM-L6-v2')
+                print("[N.O.V.A.] Model loaded.")
     return _model
 
+@tracing.traced("engine.calculate_semantic_similarity")
 def calculate_semantic_similarity(original_text, modified_text):
     """Proves zero hallucination even if minor typos were fixed."""
     model = _get_model()
-    emb1 = model.encode(original_text, convert_to_tensor=True)
-    emb2 = model.encode(modified_text, convert_to_tensor=True)
+    with tracing.span("engine.embed"):
+        emb1 = model.encode(original_text, convert_to_tensor=True)
+        emb2 = model.encode(modified_text, convert_to_tensor=True)
     cosine_scores = util.cos_sim(emb1, emb2)
     return float(cosine_scores[0][0])
 
+# ── Paragraph-level drift ─────────────────────────────────────────────────────
+# calculate_semantic_similarity gives one number for a whole manuscript, which
+# hides a single rewritten claim among hundreds of untouched paragraphs. Here
+# each paragraph is matched on its own: identical paragraphs pair up by string
+# equality (no model call), the rest are embedded in batches and compared
+# through one cosine-similarity matrix.
+
+DRIFT_THRESHOLD  = float(os.environ.get("NOVA_DRIFT_THRESHOLD", "0.85"))
+EMBED_BATCH_SIZE = int(os.environ.get("NOVA_EMBED_BATCH_SIZE", "64"))
+_DRIFT_BLOCK     = 2048    # rows of the similarity matrix held in memory at once
+
+def _embed_paragraphs(paragraphs):
+    """Unit-length embeddings (float32, one row per paragraph)."""
+    if not paragraphs:
+        return np.zeros((0, 0), dtype=np.float32)
+    model = _get_model()
+    with tracing.span("engine.embed"):
+        emb = np.asarray(model.encode(paragraphs, batch_size=EMBED_BATCH_SIZE), dtype=np.float32)
+    norms = np.linalg.norm(emb, axis=1, keepdims=True)
+    return emb / np.maximum(norms, 1e-12)
+
+def _best_matches(a, b):
+    """For each row of `a`, the index and cosine similarity of its closest row in `b`."""
+    idx = np.zeros(len(a), dtype=np.int64)
+    sim = np.full(len(a), -1.0, dtype=np.float32)
+    if len(a) and len(b):
+        for start in range(0, len(a), _DRIFT_BLOCK):
+            block = a[start:start + _DRIFT_BLOCK] @ b.T
+            idx[start:start + len(block)] = block.argmax(axis=1)
+            sim[start:start + len(block)] = block.max(axis=1)
+    return idx, sim
+
+@tracing.traced("engine.compare_paragraphs")
+def compare_paragraphs(original, modified, threshold=None):
+    """
+    Align two lists of paragraphs. Returns
+        {"pairs":    [(orig_index, mod_index or None, similarity), ...]  one per original paragraph,
+         "drifted":  the pairs whose similarity is below `threshold`,
+         "added":    [(mod_index, best similarity to any original), ...] below threshold,
+         "similarity": mean similarity over original paragraphs}
+    An original paragraph with nothing similar enough in `modified` is
+    reported with its closest match, so the report can show what it became.
+    """
+    threshold = DRIFT_THRESHOLD if threshold is None else threshold
+
+    # Unchanged paragraphs: exact text match, similarity 1.0
+    positions = {}
+    for j, p in enumerate(modified):
+        positions.setdefault(p, []).append(j)
+    pairs, changed_orig, used = [None] * len(original), [], set()
+    for i, p in enumerate(original):
+        slots = positions.get(p)
+        if slots:
+            j = slots.pop(0)
+            used.add(j)
+            pairs[i] = (i, j, 1.0)
+        else:
+            changed_orig.append(i)
+    changed_mod = [j for j in range(len(modified)) if j not in used]
+
+    emb_orig = _embed_paragraphs([original[i] for i in changed_orig])
+    emb_mod  = _embed_paragraphs([modified[j] for j in changed_mod])
+
+    idx, sim = _best_matches(emb_orig, emb_mod)
+    for k, i in enumerate(changed_orig):
+        pairs[i] = (i, changed_mod[idx[k]] if changed_mod else None, float(max(sim[k], 0.0)))
+
+    # New paragraphs: nothing in the original is close, and no drifted
+    # original paragraph already points at them
+    _, back_sim = _best_matches(emb_mod, emb_orig)
+    matched = {p[1] for p in pairs}
+    added = [(j, float(max(back_sim[k], 0.0))) for k, j in enumerate(changed_mod)
+             if back_sim[k] < threshold and j not in matched]
+
+    return {
+        "pairs":      pairs,
+        "drifted":    [p for p in pairs if p[2] < threshold],
+        "added":      added,
+        "similarity": float(np.mean([p[2] for p in pairs])) if pairs else 1.0,
+    }
+
+
 if __name__ == "__main__":
     pass
 
+@tracing.traced("engine.get_semantic_hash")
 def get_semantic_hash(text):
     """
     Creates a visual 'Locality-Sensitive Hash' (LSH).
@@ -271,7 +569,8 @@ def get_semantic_hash(text):
     model = _get_model()
 
     # Binarize the first 64 dimensions (1 if > 0 else 0)
-    emb = model.encode(text)
+    with tracing.span("engine.embed"):
+        emb = model.encode(text)
     binary_hash = "".join(["1" if val > 0 else "0" for val in emb[:64]])
 
     # Format with spaces for readability in the UI (e.g., "1101 0010 ...")
@@ -282,11 +581,16 @@ def get_semantic_hash(text):
 # Runs once when this module is first imported (i.e. when uvicorn starts).
 # Tells you immediately in the terminal if Ollama is reachable.
 def _check_ollama():
+    backend = llm.get_backend()
+    if backend.name == "replay":
+        print(f"[N.O.V.A.] ▶️  LLM replay mode — answering from {backend.cassette.path}")
+        return
     try:
-        ollama.list()
-        print(f"[N.O.V.A.] ✅ Ollama is reachable. Using model: '{OLLAMA_MODEL}'")
         # Check if the model is actually pulled
-        models = [m['model'] for m in ollama.list().get('models', [])]
+        models = llm.list_models()
+        print(f"[N.O.V.A.] ✅ Ollama is reachable. Using model: '{OLLAMA_MODEL}'")
+        if backend.name == "record":
+            print(f"[N.O.V.A.] ⏺️  Recording LLM responses to {backend.cassette.path}")
         if not any(OLLAMA_MODEL in m for m in models):
             print(f"[N.O.V.A.] ⚠️  Model '{OLLAMA_MODEL}' is NOT pulled yet!")
             print(f"[N.O.V.A.] ⚠️  Run:  ollama pull {OLLAMA_MODEL}")
@@ -294,4 +598,4 @@ def _check_ollama():
         print(f"[N.O.V.A.] ⚠️  Ollama is NOT reachable: {e}")
         print("[N.O.V.A.] ⚠️  Start Ollama with:  ollama serve")
 
-_check_ollama()
\ No newline at end of file
+_check_ollama()
@@ -0,0 +1,185 @@
+import io
+import os
+import re
+import zipfile
+import threading
+from xml.sax.saxutils import escape
+
+import docx
+
+from . import engine, formatter, tracing
+
+# ==========================================
+# DOCX EXPORT
+# ==========================================
+# Builds the downloadable .docx straight from a cached template package:
+# every part except word/document.xml is copied byte-for-byte from the
+# template, and document.xml is streamed into the zip one paragraph at a time
+# using the template's own Title / Heading N styles. No python-docx object
+# tree is built per request, so export time and size grow linearly with the
+# manuscript.
+#
+# NOVA_DOCX_TEMPLATE points at a styled .docx to use instead of python-docx's
+# default template (only its styles, page setup and other parts are used —
+# its body text is dropped).
+
+DATA_DIR      = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data")
+TEMPLATE_DOCX = os.environ.get("NOVA_DOCX_TEMPLATE", os.path.join(DATA_DIR, "template.docx"))
+
+DOCUMENT_PART = "word/document.xml"
+
+# XML 1.0 forbids most control characters; Word refuses files containing them.
+_INVALID_XML = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+_MARKER      = re.compile(r'@@(H[123]|FIG|TABLE|EQ)@@(.+)@@END@@')
+_INLINE_MATH = re.compile(r'@@M@@(.+?)@@END@@')
+
+
+class _Template:
+    """The parts of a template package that are reused verbatim on every export."""
+
+    def __init__(self, path):
+        if os.path.exists(path):
+            document = docx.Document(path)
+            print(f"[N.O.V.A.] DOCX template loaded: {path}")
+        else:
+            document = docx.Document()
+
+        # Style ids differ from display names ("Heading 1" → "Heading1") and
+        # can be localised in custom templates — resolve them once.
+        self.style_ids = {}
+        for name in ("Title", "Heading 1", "Heading 2", "Heading 3", "Table Grid"):
+            try:
+                self.style_ids[name] = document.styles[name].style_id
+            except KeyError:
+                self.style_ids[name] = None
+
+        buf = io.BytesIO()
+        document.save(buf)
+        buf.seek(0)
+
+        # (name, compress_type, bytes) in package order, document.xml with None.
+        # Not ZipInfo objects: ZipFile.writestr fills in offsets and CRCs on
+        # the ZipInfo it is given, so a shared one would be clobbered by
+        # concurrent exports.
+        self.parts = []
+        with zipfile.ZipFile(buf) as zf:
+            for info in zf.infolist():
+                data = None if info.filename == DOCUMENT_PART else zf.read(info)
+                self.parts.append((info.filename, info.compress_type, data))
+            document_xml = zf.read(DOCUMENT_PART).decode("utf-8")
+
+        # Everything up to and including <w:body>, and the trailing section
+        # properties (page size/margins) that must stay the last child of <w:body>.
+        body_start = document_xml.index("<w:body>") + len("<w:body>")
+        self.head = document_xml[:body_start].encode("utf-8")
+        sect = re.search(r'<w:sectPr\b.*</w:sectPr>\s*</w:body>', document_xml, re.DOTALL)
+        tail = sect.group(0) if sect else "</w:body>"
+        self.tail = (tail + "</w:document>").encode("utf-8")
+
+
+_template      = None
+_template_lock = threading.Lock()
+
+def _get_template():
+    global _template
+    tracing.record_cache("docx_template", _template is not None)
+    if _template is None:
+        with _template_lock:
+            if _template is None:
+                _template = _Template(TEMPLATE_DOCX)
+    return _template
+
+
+def _paragraph(text, style_id=None, center=False, italic=False) -> str:
+    # Equations stay as their LaTeX source — Word shows it as plain text
+    text = escape(_INVALID_XML.sub("", _INLINE_MATH.sub(r"\1", text)))
+    ppr = ""
+    if style_id or center:
+        ppr = "<w:pPr>"
+        if style_id:
+            ppr += f'<w:pStyle w:val="{style_id}"/>'
+        if center:
+            ppr += '<w:jc w:val="center"/>'
+        ppr += "</w:pPr>"
+    rpr = "<w:rPr><w:i/></w:rPr>" if italic else ""
+    return f'<w:p>{ppr}<w:r>{rpr}<w:t xml:space="preserve">{text}</w:t></w:r></w:p>'
+
+
+def _table(rows_json, style_id) -> str:
+    rows = formatter.table_rows(rows_json)
+    if rows is None:
+        return _paragraph(rows_json)
+    if not any(rows):
+        return ""
+    ncols = max(len(r) for r in rows)
+    tblpr = f'<w:tblPr><w:tblStyle w:val="{style_id}"/><w:tblW w:w="0" w:type="auto"/></w:tblPr>' if style_id \
+        else '<w:tblPr><w:tblW w:w="0" w:type="auto"/></w:tblPr>'
+    grid = "<w:tblGrid>" + "<w:gridCol/>" * ncols + "</w:tblGrid>"
+    body = "".join(
+        "<w:tr>" + "".join(f"<w:tc>{_paragraph(str(c))}</w:tc>" for c in r + [""] * (ncols - len(r))) + "</w:tr>"
+        for r in rows
+    )
+    return f"<w:tbl>{tblpr}{grid}{body}</w:tbl>"
+
+
+def _blocks(metadata, raw_text, style_ids):
+    """Yield document.xml paragraphs: header, abstract, one per body block, references."""
+    h1 = style_ids["Heading 1"]
+
+    yield _paragraph(metadata.get('title', '') or 'Untitled', style_ids["Title"], center=True)
+    # Fields may arrive as null from the client
+    authors = metadata.get('authors', '') or ''
+    if authors:
+        yield _paragraph(authors, center=True, italic=True)
+
+    yield _paragraph('Abstract', h1)
+    yield _paragraph(metadata.get('abstract', '') or '')
+
+    # Same body the PDF gets: headings tagged, preamble (already emitted above) removed
+    for line in formatter.prepare_body(metadata, raw_text).split('\n'):
+        line = line.strip()
+        if not line:
+            continue
+        m = _MARKER.match(line)
+        kind = m.group(1) if m else None
+        if kind in ("H1", "H2", "H3"):
+            yield _paragraph(m.group(2), style_ids[f"Heading {kind[1]}"])
+        elif kind == "TABLE":
+            yield _table(m.group(2), style_ids["Table Grid"])
+        elif kind == "FIG":
+            # Images live in the compile workspace, not in this package
+            yield _paragraph(f"[Figure: {os.path.basename(m.group(2))}]", center=True, italic=True)
+        elif kind == "EQ":
+            yield _paragraph(m.group(2), center=True)
+        else:
+            yield _paragraph(line)
+
+    # The references are normally already the tail of raw_text — only add
+    # them separately when they came from somewhere else.
+    refs = metadata.get('references', '') or ''
+    if refs and refs != engine.NO_REFERENCES and refs not in raw_text:
+        yield _paragraph('References', h1)
+        for ref in refs.split('\n'):
+            if ref.strip():
+                yield _paragraph(ref.strip())
+
+
+@tracing.traced("exporter.build_docx")
+def build_docx(metadata, raw_text) -> memoryview:
+    """
+    Builds the manuscript .docx and returns a view of the finished package
+    (bytes-like; pass it straight to the HTTP response).
+    """
+    template = _get_template()
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, compress_type, data in template.parts:
+            if data is not None:
+                zf.writestr(name, data, compress_type=compress_type)
+                continue
+            with zf.open(DOCUMENT_PART, "w") as out:
+                out.write(template.head)
+                for block in _blocks(metadata, raw_text, template.style_ids):
+                    out.write(block.encode("utf-8"))
+                out.write(template.tail)
+    return buf.getbuffer()
@@ -1,59 +1,184 @@
 import os
 import re
+import json
+import shutil
+import hashlib
+import threading
 import subprocess
 
+from . import references, tracing
+from .omml import ALLOWED_COMMANDS as _MATH_COMMANDS
+from .references import latex_escape as _latex_escape
+
 DATA_DIR     = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data")
 TEMPLATE_TEX = os.path.join(DATA_DIR, "template.tex")
-OUTPUT_TEX   = os.path.join(DATA_DIR, "output.tex")
-OUTPUT_PDF   = os.path.join(DATA_DIR, "output.pdf")
-OUTPUT_LOG   = os.path.join(DATA_DIR, "output.log")
-
-
-def _latex_escape(text: str) -> str:
-    """Escape characters that have special meaning in LaTeX."""
-    replacements = [
-        ('\\', r'\textbackslash{}'),   # must be first
-        ('&',  r'\&'),
-        ('%',  r'\%'),
-        ('$',  r'\$'),
-        ('#',  r'\#'),
-        ('_',  r'\_'),
-        ('{',  r'\{'),
-        ('}',  r'\}'),
-        ('~',  r'\textasciitilde{}'),
-        ('^',  r'\textasciicircum{}'),
-    ]
-    for char, escaped in replacements:
-        text = text.replace(char, escaped)
-    return text
-
-
-def _convert_headings(text: str) -> str:
-    """
-    Convert @@H1@@...@@END@@ markers into LaTeX section commands.
-    Plain text lines are LaTeX-escaped as-is.
+BUILDS_DIR   = os.path.join(DATA_DIR, "builds")
+MEDIA_DIR    = os.path.join(DATA_DIR, "media")    # images extracted by engine.py
+
+# Formats pdflatex can \includegraphics directly
+GRAPHICS_EXTS = ('.png', '.jpg', '.jpeg', '.pdf')
+
+# pdflatex is rerun until output.aux stops changing (cross-references and
+# citations settle), but never more than this many times.
+MAX_LATEX_PASSES   = int(os.environ.get("NOVA_MAX_LATEX_PASSES", "4"))
+# Oldest build directories beyond this count are deleted.
+MAX_BUILD_SESSIONS = int(os.environ.get("NOVA_MAX_BUILD_SESSIONS", "32"))
+# Only the first few "!" error lines from output.log are reported.
+MAX_LOG_ERRORS     = 5
+
+# "[3]", "[1, 4]", "[2-5]" / "[2–5]" in body text
+_CITATION     = re.compile(r'\[(\d+(?:\s*[,\-–]\s*\d+)*)\]')
+_REFS_HEADING = re.compile(r'^@@H1@@\s*(?:References|Bibliography)\s*@@END@@[ \t]*$', re.IGNORECASE | re.MULTILINE)
+# Unstyled manuscripts: a line that is just "References" (the line PASS 2 of
+# engine.get_document_metadata starts from), optionally numbered "VIII."
+_REFS_LINE    = re.compile(r'^[ \t]*(?:[IVXLC]+\.|\d+\.)?[ \t]*(?:References|Bibliography)[ \t:]*$', re.IGNORECASE | re.MULTILINE)
+
+
+def _safe_math(latex: str):
+    """
+    Returns `latex` if it only uses the commands engine/omml.py generates and
+    its braces balance, else None. raw_text round-trips through the browser,
+    so math is never passed to pdflatex unchecked.
+    """
+    if '@@' in latex or '$' in latex.replace(r'\$', ''):
+        return None
+    if any(cmd not in _MATH_COMMANDS for cmd in re.findall(r'\\([A-Za-z]+)', latex)):
+        return None
+    if re.search(r'\\[^A-Za-z#$%&_{}|,;! ]', latex):
+        return None
+    depth = 0
+    for ch in re.sub(r'\\[{}]', '', latex):
+        depth += (ch == '{') - (ch == '}')
+        if depth < 0:
+            return None
+    return latex if depth == 0 else None
+
+def _cite_keys(spec: str, cites: dict):
+    """BibTeX keys for "1, 3-5"; None unless every number is a known reference."""
+    numbers = []
+    for part in spec.split(','):
+        bounds = re.split(r'[-–]', part)
+        lo, hi = int(bounds[0]), int(bounds[-1])
+        if hi < lo or hi - lo > 100:
+            return None
+        numbers.extend(range(lo, hi + 1))
+    keys = []
+    for n in numbers:
+        if n not in cites:
+            return None
+        if cites[n] not in keys:
+            keys.append(cites[n])
+    return keys
+
+def _cite(text: str, cites: dict) -> str:
+    """Escape text, turning "[n]" / "[1, 3-5]" citations into \\cite{keys}."""
+    out, pos = [], 0
+    for m in _CITATION.finditer(text):
+        keys = _cite_keys(m.group(1), cites)
+        if keys is None:
+            continue    # "[3]" with no matching reference stays literal
+        out.append(_latex_escape(text[pos:m.start()]))
+        out.append('\\cite{%s}' % ','.join(keys))
+        pos = m.end()
+    out.append(_latex_escape(text[pos:]))
+    return ''.join(out)
+
+def _inline(text: str, cites: dict = None) -> str:
+    """
+    Escape a line of text, rendering @@M@@...@@END@@ inline equations as $...$
+    (and numbered citations as \\cite when `cites` maps numbers to keys).
+    """
+    parts = re.split(r'@@M@@(.+?)@@END@@', text)
+    out = []
+    for i, part in enumerate(parts):
+        if i % 2:
+            math = _safe_math(part)
+            out.append(f'${math}$' if math is not None else _latex_escape(part))
+        else:
+            out.append(_cite(part, cites) if cites else _latex_escape(part))
+    return ''.join(out)
+
+def _figure(path: str) -> str:
+    name = os.path.basename(path)
+    ok = (re.fullmatch(r'[0-9a-f]{16}/[\w.-]+', path)
+          and name.lower().endswith(GRAPHICS_EXTS)
+          and os.path.exists(os.path.join(MEDIA_DIR, path)))
+    if not ok:
+        return f'[Figure: {_latex_escape(name)}]'
+    # Found through TEXINPUTS (see _compile), so the path stays relative to MEDIA_DIR
+    return ('\\begin{figure}[htbp]\n\\centering\n'
+            f'\\includegraphics[width=\\columnwidth]{{{path}}}\n'
+            '\\end{figure}')
+
+def table_rows(rows_json: str):
+    """
+    The rows of a @@TABLE@@ payload as a list of lists, or None when it is not
+    valid JSON of that shape (the marker text comes back from the client).
+    """
+    try:
+        rows = json.loads(rows_json)
+    except ValueError:
+        return None
+    if not isinstance(rows, list) or not all(isinstance(r, list) for r in rows):
+        return None
+    return rows
+
+def _table(rows_json: str) -> str:
+    rows = table_rows(rows_json)
+    if rows is None:
+        return _latex_escape(rows_json)
+    if not any(rows):
+        return ''
+    ncols = max(len(r) for r in rows)
+    body = '\n'.join(
+        ' & '.join(_inline(str(c).replace('\n', ' ')) for c in r + [''] * (ncols - len(r))) + r' \\ \hline'
+        for r in rows
+    )
+    tabular = f'\\begin{{tabular}}{{|{"l|" * ncols}}}\n\\hline\n{body}\n\\end{{tabular}}'
+    if ncols > 3:
+        # Wide tables would run off a two-column IEEE page
+        tabular = f'\\resizebox{{\\columnwidth}}{{!}}{{{tabular}}}'
+    return f'\\begin{{table}}[htbp]\n\\centering\n{tabular}\n\\end{{table}}'
+
+
+@tracing.traced("formatter.convert_headings")
+def _convert_headings(text: str, cites: dict = None) -> str:
+    """
+    Convert @@H1@@...@@END@@ markers into LaTeX section commands, and the
+    @@FIG@@ / @@TABLE@@ / @@EQ@@ blocks into figure, tabular and equation
+    environments. Plain text lines are LaTeX-escaped as-is, with numbered
+    citations found in `cites` (reference number → key) becoming \\cite.
     """
     lines = text.split('\n')
     latex_lines = []
     for line in lines:
-        m1 = re.match(r'@@H1@@(.+?)@@END@@', line)
-        m2 = re.match(r'@@H2@@(.+?)@@END@@', line)
-        m3 = re.match(r'@@H3@@(.+?)@@END@@', line)
-        if m1:
-            latex_lines.append(f'\n\\section{{{_latex_escape(m1.group(1))}}}\n')
-        elif m2:
-            latex_lines.append(f'\n\\subsection{{{_latex_escape(m2.group(1))}}}\n')
-        elif m3:
-            latex_lines.append(f'\n\\subsubsection{{{_latex_escape(m3.group(1))}}}\n')
+        # Greedy up to the last @@END@@ — tables and headings may contain inline @@M@@ math
+        m = re.match(r'@@(H[123]|FIG|TABLE|EQ)@@(.+)@@END@@', line)
+        kind = m.group(1) if m else None
+        if kind == 'H1':
+            latex_lines.append(f'\n\\section{{{_inline(m.group(2))}}}\n')
+        elif kind == 'H2':
+            latex_lines.append(f'\n\\subsection{{{_inline(m.group(2))}}}\n')
+        elif kind == 'H3':
+            latex_lines.append(f'\n\\subsubsection{{{_inline(m.group(2))}}}\n')
+        elif kind == 'FIG':
+            latex_lines.append(_figure(m.group(2)))
+        elif kind == 'TABLE':
+            latex_lines.append(_table(m.group(2)))
+        elif kind == 'EQ':
+            math = _safe_math(m.group(2))
+            latex_lines.append(f'\\begin{{equation}}\n{math}\n\\end{{equation}}' if math is not None
+                               else _latex_escape(m.group(2)))
         else:
-            latex_lines.append(_latex_escape(line))
-            
+            latex_lines.append(_inline(line, cites))
+
     # Use double-newlines so LaTeX recognizes paragraph breaks instead of 
     # merging everything into single blocks. This also ensures each reference 
     # appears on a new line (if they were separate paragraphs in the original doc).
     return '\n\n'.join(latex_lines)
 
 
+@tracing.traced("formatter.apply_metadata_headings")
 def _apply_metadata_headings(body_text: str, headings_str: str, metadata: dict) -> str:
     """
     Filters the @@H*@@ markers already placed by engine.extract_text_from_docx.
@@ -109,86 +234,301 @@ def _apply_metadata_headings(body_text: str, headings_str: str, metadata: dict)
     return body_text
 
 
-def generate_pdf(metadata, body_text):
+def prepare_body(metadata, body_text):
+    """
+    Tags headings (see _apply_metadata_headings), drops the title/author/abstract
+    preamble that the template renders itself, and strips hand-typed section
+    numbers. Returns the body with @@H*@@ markers, ready for rendering.
+    """
+    return split_preamble(metadata, body_text)[1]
+
+
+def split_preamble(metadata, body_text):
+    """
+    (preamble, body): the front matter prepare_body drops — title, authors,
+    affiliations, abstract, keywords — and the prepared body itself.
+    """
+    # Tag known section headings using LLM-extracted list, filtered against title/authors
+    headings_str = metadata.get('headings', '')
+    tagged_body  = _apply_metadata_headings(body_text, headings_str, metadata)
+
+    # ── Strip Preamble ──────────────────────────────────────────────
+    # Find the first real section marker. The naive way (find the first @@H1@@)
+    # fails if a DOCX style spuriously tagged the title or author line as a heading.
+    # Instead, we look for 'Introduction' or the first LLM-extracted heading.
+    cut_index = -1
+    intro_match = re.search(r'@@H[123]@@(I\.?\s*)?Introduction@@END@@', tagged_body, re.IGNORECASE)
+    if intro_match:
+        cut_index = intro_match.start()
+    else:
+        # Fallback: cut at the first marker that comes AFTER the abstract text
+        # (to avoid cutting at a spurious title marker)
+        abstract_text = (metadata.get('abstract', '') or '').strip()
+        if abstract_text and abstract_text in tagged_body:
+            after_abs = tagged_body.find(abstract_text) + len(abstract_text)
+            first_marker = tagged_body.find('@@H', after_abs)
+            if first_marker != -1:
+                cut_index = first_marker
+        else:
+            # Last resort: just cut at the first marker
+            cut_index = tagged_body.find('@@H')
+
+    preamble = ''
+    if cut_index > 0:
+        preamble, tagged_body = tagged_body[:cut_index], tagged_body[cut_index:]
+
+    # Finally, strip any hardcoded Roman numerals from the tagged headings
+    # because \section{} generates its own Roman numerals.
+    # Matches @@H1@@ I. Introduction @@END@@  ->  @@H1@@ Introduction @@END@@
+    return preamble, re.sub(
+        r'(@@H[123]@@)\s*(?:[IVXLCDM]+\.|[0-9]+\.)\s*(.*?)(@@END@@)',
+        r'\1\2\3',
+        tagged_body,
+        flags=re.IGNORECASE
+    )
+
+
+def split_references(body: str):
+    """
+    Split a prepared body (see prepare_body) into the body without its
+    References section and the text of that section ('' if there is none).
+    """
+    m = _REFS_HEADING.search(body)
+    if not m:
+        # No heading marker — fall back to the last plain "References" line
+        m = None
+        for m in _REFS_LINE.finditer(body):
+            pass
+        if m is None:
+            return body, ''
+    # The section runs to the next top-level heading (appendices) or the end
+    nxt = re.compile(r'^@@H1@@', re.MULTILINE).search(body, m.end())
+    end = nxt.start() if nxt else len(body)
+    return body[:m.start()] + body[end:], body[m.end():end]
+
+
+def _bibliography(entries) -> str:
+    items = '\n'.join(f'\\bibitem{{{e["key"]}}} {_inline(e["text"])}' for e in entries)
+    return f'\\begin{{thebibliography}}{{{len(entries)}}}\n{items}\n\\end{{thebibliography}}'
+
+
+def _render(metadata, body_text):
+    """(complete .tex source, parsed reference entries)"""
+    with open(TEMPLATE_TEX, "r", encoding="utf-8") as f:
+        tex_content = f.read()
+
+    # Escape metadata fields, convert body headings to LaTeX sections
+    tex_content = tex_content.replace("[[TITLE]]",    _latex_escape(metadata.get('title')    or 'Untitled'))
+    tex_content = tex_content.replace("[[AUTHORS]]",  _latex_escape(metadata.get('authors')  or 'Anonymous'))
+    tex_content = tex_content.replace("[[ABSTRACT]]", _latex_escape(metadata.get('abstract') or ''))
+
+    # The References section is parsed into entries: the body cites them by
+    # key and they are typeset as a thebibliography list at the end.
+    body, refs_text = split_references(prepare_body(metadata, body_text))
+    entries = references.parse_references(refs_text) if refs_text.strip() else []
+    latex_body = _convert_headings(body, references.citation_map(entries))
+    if entries:
+        latex_body += '\n\n' + _bibliography(entries)
+
+    return tex_content.replace("[[BODY]]", latex_body), entries
+
+
+@tracing.traced("formatter.render_tex")
+def render_tex(metadata, body_text):
     """
     Injects metadata into template.tex (escaping LaTeX special chars and
-    converting heading markers), then compiles with pdflatex.
-    Returns raw PDF bytes on success, or raises RuntimeError on failure.
+    converting heading markers). Returns the complete .tex source.
+    """
+    return _render(metadata, body_text)[0]
+
+
+def document_references(metadata, body_text) -> list:
+    """The manuscript's parsed, de-duplicated references (see references.py)."""
+    _, refs_text = split_references(prepare_body(metadata, body_text))
+    return references.parse_references(refs_text) if refs_text.strip() else []
+
+
+# ── Build driver ───────────────────────────────────────────────────────────────
+# Each document session gets its own directory under data/builds/ holding
+# output.tex/.aux/.log/.pdf from the previous build, so:
+#   • an unchanged .tex (same SHA-256) returns the previous PDF without compiling
+#   • a changed .tex starts from the previous .aux, and pdflatex is rerun only
+#     while the .aux keeps changing — usually one pass for an edit that didn't
+#     move any references, two for a fresh document.
+
+_session_locks = {}
+_session_locks_guard = threading.Lock()
+
+def session_id_for(metadata) -> str:
+    """Default build session: one per document, keyed on title + authors."""
+    key = f"{metadata.get('title', '')}\x00{metadata.get('authors', '')}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+
+def _clean_session_id(session_id: str) -> str:
+    # Session ids become directory names — never let one escape BUILDS_DIR
+    if re.fullmatch(r'[A-Za-z0-9_-]{1,64}', session_id):
+        return session_id
+    return hashlib.sha256(session_id.encode("utf-8")).hexdigest()[:16]
+
+def _session_lock(session_id):
+    with _session_locks_guard:
+        lock = _session_locks.get(session_id)
+        if lock is None:
+            lock = _session_locks[session_id] = threading.Lock()
+        return lock
+
+def _file_sha256(path):
+    if not os.path.exists(path):
+        return None
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(65536), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def _log_errors(log_path):
     """
+    Stream output.log and return its "!" error lines (each with the "l.<n>"
+    line that locates it), without reading the whole log into memory.
+    """
+    errors = []
+    if not os.path.exists(log_path):
+        return errors
+    with open(log_path, "r", encoding="utf-8", errors="replace") as f:
+        pending = None
+        for line in f:
+            if line.startswith("!"):
+                if pending:
+                    errors.append(pending)
+                    if len(errors) >= MAX_LOG_ERRORS:
+                        return errors
+                pending = line.rstrip()
+            elif pending and line.startswith("l."):
+                errors.append(f"{pending} ({line.strip()})")
+                pending = None
+                if len(errors) >= MAX_LOG_ERRORS:
+                    return errors
+        if pending:
+            errors.append(pending)
+    return errors
+
+def _prune_builds(keep):
     try:
-        with open(TEMPLATE_TEX, "r", encoding="utf-8") as f:
-            tex_content = f.read()
-
-        # Escape metadata fields, convert body headings to LaTeX sections
-        tex_content = tex_content.replace("[[TITLE]]",    _latex_escape(metadata.get('title',    'Untitled')))
-        tex_content = tex_content.replace("[[AUTHORS]]",  _latex_escape(metadata.get('authors',  'Anonymous')))
-        tex_content = tex_content.replace("[[ABSTRACT]]", _latex_escape(metadata.get('abstract', '')))
-        # Tag known section headings using LLM-extracted list, filtered against title/authors
-        headings_str = metadata.get('headings', '')
-        tagged_body  = _apply_metadata_headings(body_text, headings_str, metadata)
-
-        # ── Strip Preamble ──────────────────────────────────────────────
-        # Find the first real section marker. The naive way (find the first @@H1@@)
-        # fails if a DOCX style spuriously tagged the title or author line as a heading.
-        # Instead, we look for 'Introduction' or the first LLM-extracted heading.
-        cut_index = -1
-        intro_match = re.search(r'@@H[123]@@(I\.?\s*)?Introduction@@END@@', tagged_body, re.IGNORECASE)
-        if intro_match:
-            cut_index = intro_match.start()
-        else:
-            # Fallback: cut at the first marker that comes AFTER the abstract text
-            # (to avoid cutting at a spurious title marker)
-            abstract_text = metadata.get('abstract', '').strip()
-            if abstract_text and abstract_text in tagged_body:
-                after_abs = tagged_body.find(abstract_text) + len(abstract_text)
-                first_marker = tagged_body.find('@@H', after_abs)
-                if first_marker != -1:
-                    cut_index = first_marker
-            else:
-                # Last resort: just cut at the first marker
-                cut_index = tagged_body.find('@@H')
-
-        if cut_index > 0:
-            tagged_body = tagged_body[cut_index:]
-
-        # Finally, strip any hardcoded Roman numerals from the tagged headings
-        # because \section{} generates its own Roman numerals.
-        # Matches @@H1@@ I. Introduction @@END@@  ->  @@H1@@ Introduction @@END@@
-        tagged_body = re.sub(
-            r'(@@H[123]@@)\s*(?:[IVXLCDM]+\.|[0-9]+\.)\s*(.*?)(@@END@@)',
-            r'\1\2\3',
-            tagged_body,
-            flags=re.IGNORECASE
-        )
-
-        tex_content = tex_content.replace("[[BODY]]", _convert_headings(tagged_body))
-
-        with open(OUTPUT_TEX, "w", encoding="utf-8") as f:
-            f.write(tex_content)
-
-        result = subprocess.run(
-            ["pdflatex", "-interaction=nonstopmode", OUTPUT_TEX],
-            cwd=DATA_DIR,
-            capture_output=True,
-        )
+        sessions = [os.path.join(BUILDS_DIR, d) for d in os.listdir(BUILDS_DIR)]
+    except OSError:
+        return
+    sessions = [d for d in sessions if os.path.isdir(d) and os.path.basename(d) != keep]
+    excess = len(sessions) + 1 - MAX_BUILD_SESSIONS
+    if excess <= 0:
+        return
+    sessions.sort(key=os.path.getmtime)
+    for d in sessions:
+        if excess <= 0:
+            break
+        name = os.path.basename(d)
+        lock = _session_lock(name)
+        if not lock.acquire(blocking=False):
+            continue                    # compiling right now — prune an older one instead
+        try:
+            shutil.rmtree(d, ignore_errors=True)
+            # A waiter still holding this lock object notices it is stale (see generate_pdf)
+            with _session_locks_guard:
+                _session_locks.pop(name, None)
+        finally:
+            lock.release()
+        excess -= 1
 
-        if result.returncode != 0:
-            log = ""
-            if os.path.exists(OUTPUT_LOG):
-                with open(OUTPUT_LOG, "r", encoding="utf-8", errors="replace") as f:
-                    log = f.read()
-            error_line = next(
-                (line for line in log.splitlines() if line.startswith("!")),
-                result.stderr.decode(errors="replace") or "Unknown LaTeX error"
+def _compile(build_dir, tex_content):
+    tex_path  = os.path.join(build_dir, "output.tex")
+    aux_path  = os.path.join(build_dir, "output.aux")
+    pdf_path  = os.path.join(build_dir, "output.pdf")
+    log_path  = os.path.join(build_dir, "output.log")
+    hash_path = os.path.join(build_dir, "output.texhash")
+
+    tex_hash = hashlib.sha256(tex_content.encode("utf-8")).hexdigest()
+    if os.path.exists(pdf_path) and os.path.exists(hash_path):
+        with open(hash_path, "r", encoding="utf-8") as f:
+            if f.read().strip() == tex_hash:
+                tracing.record_cache("latex_build", True)
+                with open(pdf_path, "rb") as pdf:
+                    return pdf.read()
+    tracing.record_cache("latex_build", False)
+
+    # Invalidate first, so a failed build never looks like a cache hit next time
+    if os.path.exists(hash_path):
+        os.remove(hash_path)
+    with open(tex_path, "w", encoding="utf-8") as f:
+        f.write(tex_content)
+
+    # IEEEtran.cls lives in data/ and figures in data/media/ — let pdflatex find
+    # them from the build directory
+    # (the trailing separator keeps the default TeX search path too).
+    env = dict(os.environ)
+    env["TEXINPUTS"] = os.pathsep.join(
+        [os.path.abspath(DATA_DIR), os.path.abspath(MEDIA_DIR), env.get("TEXINPUTS", "")])
+
+    aux_before = _file_sha256(aux_path)
+    for n in range(1, MAX_LATEX_PASSES + 1):
+        with tracing.span("formatter.pdflatex"):
+            result = subprocess.run(
+                ["pdflatex", "-interaction=nonstopmode", "output.tex"],
+                cwd=build_dir,
+                capture_output=True,
+                env=env,
             )
+
+        if result.returncode != 0:
+            errors = _log_errors(log_path)
+            # A half-written .aux can break the next build too — start clean
+            if os.path.exists(aux_path):
+                os.remove(aux_path)
+            error_line = "; ".join(errors) or result.stderr.decode(errors="replace") or "Unknown LaTeX error"
             raise RuntimeError(f"LaTeX compile error: {error_line}")
 
-        if os.path.exists(OUTPUT_PDF):
-            with open(OUTPUT_PDF, "rb") as f:
-                return f.read()
+        aux_after = _file_sha256(aux_path)
+        if aux_after == aux_before:
+            break
+        aux_before = aux_after
+    print(f"[N.O.V.A.] pdflatex: {n} pass(es) in {os.path.basename(build_dir)}")
 
+    if not os.path.exists(pdf_path):
         raise RuntimeError("pdflatex ran but produced no output.pdf")
 
+    with open(hash_path, "w", encoding="utf-8") as f:
+        f.write(tex_hash)
+    with open(pdf_path, "rb") as f:
+        return f.read()
+
+
+@tracing.traced("formatter.generate_pdf")
+def generate_pdf(metadata, body_text, session_id=None):
+    """
+    Renders template.tex and compiles it with pdflatex in the document's
+    build session (see "Build driver" above).
+    Returns raw PDF bytes on success, or raises RuntimeError on failure.
+    """
+    try:
+        with tracing.span("formatter.render_tex"):
+            tex_content, entries = _render(metadata, body_text)
+
+        session_id = _clean_session_id(session_id or session_id_for(metadata))
+        build_dir  = os.path.join(BUILDS_DIR, session_id)
+
+        while True:
+            lock = _session_lock(session_id)
+            with lock:
+                if _session_locks.get(session_id) is not lock:
+                    continue            # the session was pruned while we waited — take the new lock
+                os.makedirs(build_dir, exist_ok=True)
+                # refs.bib sits next to output.tex for anyone taking the source
+                # elsewhere; this build itself uses the inline thebibliography
+                with open(os.path.join(build_dir, "refs.bib"), "w", encoding="utf-8") as f:
+                    f.write(references.to_bibtex(entries))
+                pdf_bytes = _compile(build_dir, tex_content)
+            break
+        _prune_builds(keep=session_id)
+        return pdf_bytes
+
     except RuntimeError:
         raise
     except Exception as e:
@@ -0,0 +1,238 @@
+import os
+import json
+import time
+import random
+import hashlib
+import threading
+
+from . import tracing
+
+# ==========================================
+# LLM BACKENDS
+# ==========================================
+# engine.py talks to the model only through `chat()` / `list_models()` below,
+# so the pipeline can run against a live Ollama, or against a recorded
+# "cassette" of prompt → response pairs when no model is available
+# (CI machines, load tests, regression benchmarks).
+#
+# Select the backend with NOVA_LLM_BACKEND:
+#   ollama  → talk to the local Ollama server (default)
+#   record  → talk to Ollama and save every response into the cassette
+#   replay  → answer from the cassette only; Ollama is never contacted
+#
+# NOVA_LLM_CASSETTE      path of the cassette, one JSON line per response (default: data/llm_cassette.jsonl)
+# NOVA_LLM_REPLAY_MISS   "error" (default) raises on an unknown prompt,
+#                        "empty" answers "{}" for JSON prompts and "" otherwise
+# NOVA_LLM_LATENCY       simulated latency for replay, e.g. "base=0.8,per_char=0.0005,jitter=0.2"
+#                        (seconds; jitter is seeded by the prompt hash, so runs are reproducible)
+
+DATA_DIR         = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data")
+DEFAULT_CASSETTE = os.path.join(DATA_DIR, "llm_cassette.jsonl")
+
+
+class LLMReplayMiss(LookupError):
+    """Raised by the replay backend when a prompt is not in the cassette."""
+
+
+def prompt_key(model, messages, format=None, options=None) -> str:
+    """Stable SHA-256 key for one chat request (model, messages, format, options)."""
+    payload = json.dumps(
+        {"model": model, "messages": messages, "format": format or "", "options": options or {}},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _response(content: str) -> dict:
+    # Same shape as ollama.chat() so callers can index ['message']['content']
+    return {"message": {"role": "assistant", "content": content}}
+
+
+# ── Latency model ──────────────────────────────────────────────────────────────
+
+class LatencyModel:
+    """
+    Deterministic stand-in for model latency:
+        delay = base + per_char * len(prompt + response) ± jitter
+    Jitter is drawn from a RNG seeded by the prompt key, so the same prompt
+    always "takes" the same time across runs.
+    """
+
+    def __init__(self, base=0.0, per_char=0.0, jitter=0.0):
+        self.base     = float(base)
+        self.per_char = float(per_char)
+        self.jitter   = float(jitter)
+
+    @classmethod
+    def from_spec(cls, spec: str) -> "LatencyModel":
+        """Parse "base=0.8,per_char=0.0005,jitter=0.2". Unknown keys are ignored."""
+        values = {}
+        for part in (spec or "").split(","):
+            if "=" not in part:
+                continue
+            name, value = part.split("=", 1)
+            name = name.strip()
+            if name in ("base", "per_char", "jitter"):
+                values[name] = float(value)
+        return cls(**values)
+
+    def delay(self, key: str, n_chars: int) -> float:
+        d = self.base + self.per_char * n_chars
+        if self.jitter:
+            d += random.Random(key).uniform(-self.jitter, self.jitter)
+        return max(0.0, d)
+
+
+# ── Backends ───────────────────────────────────────────────────────────────────
+
+class OllamaBackend:
+    """The real thing — forwards to the local Ollama server."""
+
+    name = "ollama"
+
+    def chat(self, model, messages, format=None, options=None) -> dict:
+        import ollama
+        kwargs = {"model": model, "messages": messages}
+        if format:
+            kwargs["format"] = format
+        if options:
+            kwargs["options"] = options
+        res = ollama.chat(**kwargs)
+        return _response(res["message"]["content"])
+
+    def list_models(self) -> list:
+        import ollama
+        return [m["model"] for m in ollama.list().get("models", [])]
+
+
+class _Cassette:
+    """
+    Thread-safe prompt-hash → response store persisted as JSON lines. Each
+    recording appends one line, so a long record session costs O(1) I/O per
+    response; on load, a later line for the same key wins.
+    """
+
+    def __init__(self, path):
+        self.path  = path
+        self._lock = threading.Lock()
+        self._data = None
+
+    def _load(self):
+        if self._data is None:
+            self._data = {}
+            if os.path.exists(self.path):
+                with open(self.path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            entry = json.loads(line)
+                        except json.JSONDecodeError:
+                            continue   # a line cut short by a crash
+                        key = entry.pop("key", None)
+                        if key:
+                            self._data[key] = entry
+        return self._data
+
+    def get(self, key):
+        with self._lock:
+            return self._load().get(key)
+
+    def put(self, key, entry):
+        with self._lock:
+            self._load()[key] = entry
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"key": key, **entry}, ensure_ascii=False, sort_keys=True) + "\n")
+                f.flush()
+
+
+class RecordBackend:
+    """Forwards to another backend (normally Ollama) and records every response."""
+
+    name = "record"
+
+    def __init__(self, cassette_path=DEFAULT_CASSETTE, inner=None):
+        self.cassette = _Cassette(cassette_path)
+        self.inner    = inner or OllamaBackend()
+
+    def chat(self, model, messages, format=None, options=None) -> dict:
+        res = self.inner.chat(model, messages, format=format, options=options)
+        key = prompt_key(model, messages, format, options)
+        self.cassette.put(key, {"model": model, "content": res["message"]["content"]})
+        return res
+
+    def list_models(self) -> list:
+        return self.inner.list_models()
+
+
+class ReplayBackend:
+    """Answers from a recorded cassette, sleeping according to the latency model."""
+
+    name = "replay"
+
+    def __init__(self, cassette_path=DEFAULT_CASSETTE, latency=None, on_miss="error"):
+        self.cassette = _Cassette(cassette_path)
+        self.latency  = latency or LatencyModel()
+        self.on_miss  = on_miss
+
+    def chat(self, model, messages, format=None, options=None) -> dict:
+        key   = prompt_key(model, messages, format, options)
+        entry = self.cassette.get(key)
+        tracing.record_cache("llm_replay", entry is not None)
+        if entry is None:
+            if self.on_miss != "empty":
+                raise LLMReplayMiss(f"No recorded response for prompt {key[:12]} (model '{model}')")
+            content = "{}" if format == "json" else ""
+        else:
+            content = entry["content"]
+
+        prompt_chars = sum(len(m.get("content", "")) for m in messages)
+        delay = self.latency.delay(key, prompt_chars + len(content))
+        if delay:
+            time.sleep(delay)
+        return _response(content)
+
+    def list_models(self) -> list:
+        with self.cassette._lock:
+            data = self.cassette._load()
+        return sorted({e.get("model", "") for e in data.values()})
+
+
+# ── Module-level selection ─────────────────────────────────────────────────────
+
+def backend_from_env():
+    kind     = os.environ.get("NOVA_LLM_BACKEND", "ollama").strip().lower()
+    cassette = os.environ.get("NOVA_LLM_CASSETTE", DEFAULT_CASSETTE)
+    if kind == "record":
+        return RecordBackend(cassette)
+    if kind == "replay":
+        return ReplayBackend(
+            cassette,
+            latency=LatencyModel.from_spec(os.environ.get("NOVA_LLM_LATENCY", "")),
+            on_miss=os.environ.get("NOVA_LLM_REPLAY_MISS", "error").strip().lower(),
+        )
+    return OllamaBackend()
+
+
+_backend      = None
+_backend_lock = threading.Lock()
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = backend_from_env()
+    return _backend
+
+def set_backend(backend):
+    """Swap the active backend (benchmarks/tests). Returns the previous one."""
+    global _backend
+    previous, _backend = _backend, backend
+    return previous
+
+
+def chat(model, messages, format=None, options=None) -> dict:
+    return get_backend().chat(model, messages, format=format, options=options)
+
+def list_models() -> list:
+    return get_backend().list_models()
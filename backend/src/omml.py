@@ -0,0 +1,127 @@
+"""
+Office Math (OMML) → LaTeX.
+
+Word stores equations as <m:oMath> trees. This converts the common
+constructs (fractions, scripts, radicals, delimiters, n-ary operators,
+functions) to LaTeX math; anything else falls back to its children in order.
+Only the commands listed in ALLOWED_COMMANDS are ever produced, and
+formatter.py refuses math containing anything else.
+"""
+
+import re
+
+M = '{http://schemas.openxmlformats.org/officeDocument/2006/math}'
+
+_SYMBOLS = {
+    'α': r'\alpha', 'β': r'\beta', 'γ': r'\gamma', 'δ': r'\delta', 'ε': r'\epsilon',
+    'ζ': r'\zeta', 'η': r'\eta', 'θ': r'\theta', 'ι': r'\iota', 'κ': r'\kappa',
+    'λ': r'\lambda', 'μ': r'\mu', 'ν': r'\nu', 'ξ': r'\xi', 'π': r'\pi',
+    'ρ': r'\rho', 'σ': r'\sigma', 'τ': r'\tau', 'υ': r'\upsilon', 'φ': r'\phi',
+    'χ': r'\chi', 'ψ': r'\psi', 'ω': r'\omega',
+    'Γ': r'\Gamma', 'Δ': r'\Delta', 'Θ': r'\Theta', 'Λ': r'\Lambda', 'Ξ': r'\Xi',
+    'Π': r'\Pi', 'Σ': r'\Sigma', 'Φ': r'\Phi', 'Ψ': r'\Psi', 'Ω': r'\Omega',
+    '≤': r'\leq', '≥': r'\geq', '≠': r'\neq', '≈': r'\approx', '≡': r'\equiv',
+    '±': r'\pm', '∓': r'\mp', '×': r'\times', '·': r'\cdot', '÷': r'\div',
+    '∞': r'\infty', '∂': r'\partial', '∇': r'\nabla', '∈': r'\in', '∉': r'\notin',
+    '⊂': r'\subset', '⊆': r'\subseteq', '∪': r'\cup', '∩': r'\cap', '∅': r'\emptyset',
+    '→': r'\rightarrow', '←': r'\leftarrow', '⇒': r'\Rightarrow', '⇔': r'\Leftrightarrow',
+    '∀': r'\forall', '∃': r'\exists', '∝': r'\propto', '…': r'\ldots', '⋯': r'\cdots',
+    '−': '-', '′': "'",
+}
+
+_NARY = {'∑': r'\sum', '∏': r'\prod', '∫': r'\int', '∬': r'\iint', '∮': r'\oint', '⋃': r'\bigcup', '⋂': r'\bigcap'}
+
+_FUNCTIONS = {'sin', 'cos', 'tan', 'log', 'ln', 'exp', 'max', 'min', 'lim', 'det', 'arg', 'sup', 'inf'}
+
+_ESCAPES = {'#': r'\#', '$': r'\$', '%': r'\%', '&': r'\&', '_': r'\_', '{': r'\{', '}': r'\}',
+            '\\': r'\backslash ', '~': r'\sim ', '^': r'\hat{}'}
+
+_ACCENTS = {'\u0304': 'bar', '\u0302': 'hat', '\u0303': 'tilde', '\u20d7': 'vec', '\u0307': 'dot'}
+
+ALLOWED_COMMANDS = (
+    set(re.findall(r'\\([A-Za-z]+)', ''.join(list(_SYMBOLS.values()) + list(_NARY.values()) + list(_ESCAPES.values()))))
+    | _FUNCTIONS
+    | set(_ACCENTS.values())
+    | {'frac', 'sqrt', 'left', 'right', 'mathrm', 'overline', 'underline'}
+)
+
+
+def _val(elem, path):
+    node = elem.find(path)
+    return node.get(M + 'val') if node is not None else None
+
+def _text(s):
+    out = []
+    for ch in s:
+        if ch in _SYMBOLS:
+            out.append(_SYMBOLS[ch] + ' ')
+        elif ch in _NARY:
+            out.append(_NARY[ch] + ' ')
+        elif ch in _ESCAPES:
+            out.append(_ESCAPES[ch])
+        elif ord(ch) < 128:
+            out.append(ch)
+        else:
+            out.append('?')   # pdflatex can't typeset arbitrary Unicode in math
+    return ''.join(out)
+
+def _delim(ch):
+    if not ch:
+        return '.'
+    return {'{': r'\{', '}': r'\}', '|': '|', '‖': r'\|'}.get(ch, ch if ch in '()[]' else '.')
+
+def _arg(elem, tag):
+    node = elem.find(M + tag)
+    return _children(node) if node is not None else ''
+
+def _children(elem):
+    return ''.join(convert(child) for child in elem)
+
+
+def convert(elem) -> str:
+    """LaTeX (math mode, without delimiters) for one OMML element."""
+    tag = elem.tag
+    if not tag.startswith(M):
+        return ''                                  # w:rPr and friends inside math runs
+    name = tag[len(M):]
+
+    if name.endswith('Pr'):                        # property elements carry no content
+        return ''
+    if name == 'r':
+        return ''.join(_text(t.text or '') for t in elem.iter(M + 't'))
+    if name == 'f':
+        return r'\frac{%s}{%s}' % (_arg(elem, 'num'), _arg(elem, 'den'))
+    if name == 'sSup':
+        return '{%s}^{%s}' % (_arg(elem, 'e'), _arg(elem, 'sup'))
+    if name == 'sSub':
+        return '{%s}_{%s}' % (_arg(elem, 'e'), _arg(elem, 'sub'))
+    if name == 'sSubSup':
+        return '{%s}_{%s}^{%s}' % (_arg(elem, 'e'), _arg(elem, 'sub'), _arg(elem, 'sup'))
+    if name == 'rad':
+        deg = _arg(elem, 'deg')
+        return (r'\sqrt[%s]{%s}' % (deg, _arg(elem, 'e'))) if deg else (r'\sqrt{%s}' % _arg(elem, 'e'))
+    if name == 'd':
+        beg = _val(elem, f'{M}dPr/{M}begChr')
+        end = _val(elem, f'{M}dPr/{M}endChr')
+        sep = _val(elem, f'{M}dPr/{M}sepChr') or ','
+        parts = [_children(e) for e in elem.findall(M + 'e')]
+        return r'\left%s %s \right%s' % (_delim('(' if beg is None else beg), _text(sep).join(parts),
+                                         _delim(')' if end is None else end))
+    if name == 'nary':
+        op = _NARY.get(_val(elem, f'{M}naryPr/{M}chr') or '∫', r'\int')
+        sub, sup = _arg(elem, 'sub'), _arg(elem, 'sup')
+        return op + ('_{%s}' % sub if sub else '') + ('^{%s}' % sup if sup else '') + ' ' + _arg(elem, 'e')
+    if name == 'func':
+        fname_node = elem.find(M + 'fName')
+        fname = ''.join(t.text or '' for t in fname_node.iter(M + 't')).strip() if fname_node is not None else ''
+        head = ('\\' + fname) if fname in _FUNCTIONS else (r'\mathrm{%s}' % _text(fname))
+        return head + ' ' + _arg(elem, 'e')
+    if name == 'acc':
+        accent = _ACCENTS.get(_val(elem, f'{M}accPr/{M}chr') or '\u0302', 'hat')
+        return '\\%s{%s}' % (accent, _arg(elem, 'e'))
+    if name == 'bar':
+        pos = _val(elem, f'{M}barPr/{M}pos')
+        return ('\\underline{%s}' if pos == 'bot' else '\\overline{%s}') % _arg(elem, 'e')
+
+    # oMath, oMathPara, e, num, den, box, groupChr, limLow, eqArr, … — just the content
+    return _children(elem)
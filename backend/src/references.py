@@ -0,0 +1,271 @@
+"""
+Reference list parsing, de-duplication and BibTeX output.
+
+The References section is split into entries and each entry is parsed in a
+single pass with pre-compiled patterns (authors, title, venue, year). Near-
+identical entries — the same paper pasted twice with different punctuation,
+casing or a typo — are merged using 64-bit SimHash fingerprints compared all
+at once with numpy. No LLM calls, so 500+ entry theses parse in milliseconds.
+"""
+import re
+import hashlib
+import unicodedata
+
+import numpy as np
+
+from . import tracing
+
+# Fingerprints differing in at most this many of 64 bits are the same reference
+NEAR_DUP_BITS = 5
+
+_NUMBERED  = re.compile(r'^\s*\[(\d+)\]\s*')
+_LEADING_N = re.compile(r'^\s*(\d+)[.)]\s+')
+_YEAR      = re.compile(r'\b(1[89]\d{2}|20\d{2})[a-z]?\b')
+_QUOTED    = re.compile(r'[“"]\s*(.+?)\s*[,.]?\s*[”"]')
+_APA       = re.compile(r'^(?P<authors>.+?)\s*\((?P<year>(?:1[89]|20)\d{2})[a-z]?\)\.?\s*(?P<title>[^.?!]+[.?!])\s*(?P<venue>.*)$')
+_VENUE_IN  = re.compile(r'^\s*,?\s*(?:in\s+)?(?P<venue>.+?)(?:,\s*(?:vol|no|pp|p)\.|,\s*(?:1[89]|20)\d{2}|\.\s*$|$)', re.IGNORECASE)
+_WORDS     = re.compile(r'[a-z0-9]+')
+_DIGITS    = re.compile(r'\d+')
+_SURNAME   = re.compile(r"([A-Za-z][A-Za-z'\-]+)")
+_AUTHOR_SEP = re.compile(r'\s*(?:,\s*(?:and\s+|&\s*)?|\s+and\s+|\s*&\s*)')
+_ET_AL      = re.compile(r'[,\s]*\bet\s+al\b\.?\s*$', re.IGNORECASE)
+_INITIALS   = re.compile(r'(?:[A-Z]\.?[\s-]*)+')
+
+_STOP = {'a', 'an', 'the', 'on', 'of', 'for', 'in', 'and', 'to', 'with', 'towards', 'toward', 'via', 'using'}
+
+
+# ── Splitting & parsing ────────────────────────────────────────────────────────
+
+def split_entries(text: str) -> list:
+    """
+    One string per reference. "[n]" prefixes start a new entry and any
+    following unnumbered lines are continuations; without them, every
+    non-empty line is its own entry.
+    """
+    lines = [l.strip() for l in text.split('\n') if l.strip()]
+    if not any(_NUMBERED.match(l) for l in lines):
+        return lines
+    entries = []
+    for line in lines:
+        if _NUMBERED.match(line) or not entries:
+            entries.append(line)
+        else:
+            entries[-1] += ' ' + line
+    return entries
+
+
+def parse_entry(raw: str, index: int) -> dict:
+    """Best-effort authors / title / venue / year for one reference string."""
+    entry = {'raw': raw, 'number': index, 'authors': '', 'title': '', 'venue': '', 'year': ''}
+
+    text = raw
+    m = _NUMBERED.match(text) or _LEADING_N.match(text)
+    if m:
+        entry['number'] = int(m.group(1))
+        text = text[m.end():]
+    entry['text'] = text        # the reference as written, without its number
+
+    q = _QUOTED.search(text)
+    if q:
+        # IEEE: A. Author and B. Author, "Title," in Venue, year.
+        entry['authors'] = text[:q.start()].strip(' ,.')
+        entry['title']   = q.group(1).strip(' ,.')
+        v = _VENUE_IN.match(text[q.end():])
+        if v:
+            entry['venue'] = v.group('venue').strip(' ,.')
+    else:
+        a = _APA.match(text)
+        if a:
+            # APA: Author, A., & Author, B. (2020). Title. Venue, 1(2), 3-4.
+            entry['authors'] = a.group('authors').strip(' ,.')
+            entry['year']    = a.group('year')
+            entry['title']   = a.group('title').strip(' .')
+            entry['venue']   = a.group('venue').split(',')[0].strip(' .')
+        else:
+            # Unknown style: authors up to the first ". ", title up to the next
+            parts = [p.strip() for p in re.split(r'\.\s+', text) if p.strip()]
+            if len(parts) >= 2:
+                entry['authors'], entry['title'] = parts[0], parts[1]
+                entry['venue'] = parts[2] if len(parts) > 2 else ''
+            else:
+                entry['title'] = text.strip(' .')
+
+    if _YEAR.fullmatch(entry['venue']):
+        entry['venue'] = ''        # "Title," 2001. — the year is not a venue
+    if not entry['year']:
+        years = _YEAR.findall(text)
+        entry['year'] = years[-1] if years else ''
+    return entry
+
+
+# ── De-duplication ─────────────────────────────────────────────────────────────
+
+def _normalize(text: str) -> str:
+    text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii').lower()
+    return ' '.join(_WORDS.findall(text))
+
+def _first_surname(entry) -> str:
+    if not entry['authors']:
+        return ''
+    first = re.split(r',|\band\b|&', entry['authors'])[0]
+    names = _SURNAME.findall(first)
+    return _normalize(names[-1]) if names else ''
+
+def _token_hashes(text: str) -> np.ndarray:
+    # Character 3-grams, so a one-letter typo only disturbs a few tokens
+    tokens = {text[i:i + 3] for i in range(max(1, len(text) - 2))}
+    if not text:
+        return np.zeros(1, dtype=np.uint64)
+    digest = b''.join(hashlib.blake2b(t.encode(), digest_size=8).digest() for t in tokens)
+    return np.frombuffer(digest, dtype=np.uint64)
+
+_BIT = np.uint64(1) << np.arange(64, dtype=np.uint64)
+
+def simhash(texts) -> np.ndarray:
+    """64-bit SimHash of each (normalized) text, as a uint64 array."""
+    out = np.empty(len(texts), dtype=np.uint64)
+    for i, text in enumerate(texts):
+        bits = (_token_hashes(text)[:, None] & _BIT) != 0           # tokens × 64
+        votes = bits.sum(axis=0) * 2 - bits.shape[0]                 # +1 per set bit, -1 per clear
+        out[i] = np.bitwise_or.reduce(np.where(votes > 0, _BIT, np.uint64(0)))
+    return out
+
+def _popcount(x: np.ndarray) -> np.ndarray:
+    if hasattr(np, 'bitwise_count'):                                 # numpy >= 2.0
+        return np.bitwise_count(x)
+    return np.unpackbits(x.view(np.uint8).reshape(*x.shape, 8), axis=-1).sum(axis=-1)
+
+def find_duplicates(entries: list, max_bits: int = NEAR_DUP_BITS, block: int = 1024) -> list:
+    """
+    For each entry, the index of the earlier entry it duplicates (or its own index).
+    All pairwise Hamming distances are computed block-wise in numpy.
+    """
+    n = len(entries)
+    canon = list(range(n))
+    if n < 2:
+        return canon
+    fps   = simhash([_normalize(e['title'] or e['raw']) for e in entries])
+    # Only compare within the same year, first author and title numbers — cheap
+    # to check, and keeps "Part 1" / "Part 2" style near-identical titles apart
+    group = np.array([f"{e['year']}|{_first_surname(e)}|{' '.join(_DIGITS.findall(e['title']))}"
+                      for e in entries])
+
+    for start in range(0, n, block):
+        rows = slice(start, min(start + block, n))
+        dist = _popcount(fps[rows, None] ^ fps[None, :])                # block × n
+        same = (dist <= max_bits) & (group[rows, None] == group[None, :])
+        for i_local, i in enumerate(range(rows.start, rows.stop)):
+            earlier = np.flatnonzero(same[i_local, :i])
+            if earlier.size:
+                canon[i] = canon[int(earlier[0])]
+    return canon
+
+
+# ── BibTeX ─────────────────────────────────────────────────────────────────────
+
+def latex_escape(text: str) -> str:
+    """Escape characters that have special meaning in LaTeX (and BibTeX field values)."""
+    replacements = [
+        ('\\', r'\textbackslash{}'),   # must be first
+        ('&',  r'\&'),
+        ('%',  r'\%'),
+        ('$',  r'\$'),
+        ('#',  r'\#'),
+        ('_',  r'\_'),
+        ('{',  r'\{'),
+        ('}',  r'\}'),
+        ('~',  r'\textasciitilde{}'),
+        ('^',  r'\textasciicircum{}'),
+    ]
+    for char, escaped in replacements:
+        text = text.replace(char, escaped)
+    return text
+
+def split_authors(authors: str) -> list:
+    """
+    One name per author, in a form BibTeX parses: "J. Smith" for IEEE
+    ("J. Smith, A. Jones, and B. Lee") and "Doe, J." for APA
+    ("Doe, J., & Roe, R."). "et al." becomes BibTeX's "others".
+    """
+    others = _ET_AL.search(authors)
+    if others:
+        authors = authors[:others.start()]
+    parts = [p.strip(' .') for p in _AUTHOR_SEP.split(authors)]
+    parts = [p for p in parts if p]
+    # APA alternates "Surname" and "I." — pair them back up
+    if (parts and len(parts) % 2 == 0
+            and all(_INITIALS.fullmatch(p) for p in parts[1::2])
+            and not any(_INITIALS.fullmatch(p) for p in parts[0::2])):
+        names = [f'{last}, {first}.' for last, first in zip(parts[0::2], parts[1::2])]
+    else:
+        names = parts
+    return names + ['others'] if others else names
+
+def _entry_type(entry) -> str:
+    venue = entry['venue'].lower()
+    if any(w in venue for w in ('proc', 'conf', 'symposium', 'workshop')):
+        return 'inproceedings'
+    if any(w in venue for w in ('journal', 'trans', 'letters', 'review', 'magazine')):
+        return 'article'
+    return 'misc'
+
+def _make_key(entry, taken) -> str:
+    surname = _first_surname(entry)
+    title_words = [w for w in _normalize(entry['title']).split() if w not in _STOP]
+    base = (surname.replace(' ', '') or 'ref') + (entry['year'] or '') + (title_words[0] if title_words else '')
+    key, n = base, 2
+    while key in taken:
+        key = f'{base}_{n}'
+        n += 1
+    taken.add(key)
+    return key
+
+
+@tracing.traced("references.parse")
+def parse_references(text: str) -> list:
+    """
+    Parse a References section into unique entries, each with a BibTeX key and
+    the list of original numbers that pointed at it (duplicates merge).
+    """
+    entries = [parse_entry(raw, i + 1) for i, raw in enumerate(split_entries(text))]
+    canon = find_duplicates(entries)
+
+    unique, taken = [], set()
+    by_index = {}
+    for i, entry in enumerate(entries):
+        if canon[i] == i:
+            entry['key'] = _make_key(entry, taken)
+            entry['numbers'] = [entry['number']]
+            by_index[i] = entry
+            unique.append(entry)
+        else:
+            by_index[canon[i]]['numbers'].append(entry['number'])
+    return unique
+
+
+def to_bibtex(entries: list) -> str:
+    """The parsed entries as a .bib file."""
+    out = []
+    for e in entries:
+        kind = _entry_type(e)
+        fields = []
+        if e['authors']:
+            fields.append(('author', ' and '.join(split_authors(e['authors']))))
+        if e['title']:
+            fields.append(('title', e['title']))
+        if e['venue']:
+            venue_field = {'inproceedings': 'booktitle', 'article': 'journal'}.get(kind, 'howpublished')
+            fields.append((venue_field, e['venue']))
+        if e['year']:
+            fields.append(('year', e['year']))
+        if not e['title'] or not e['authors']:
+            # Parsing was partial — keep the original text so nothing is lost
+            fields.append(('note', e['text']))
+        body = ',\n'.join(f'  {k} = {{{latex_escape(v)}}}' for k, v in fields)
+        out.append(f'@{kind}{{{e["key"]},\n{body}\n}}')
+    return '\n\n'.join(out) + ('\n' if out else '')
+
+
+def citation_map(entries: list) -> dict:
+    """Original reference number → BibTeX key."""
+    return {n: e['key'] for e in entries for n in e['numbers']}
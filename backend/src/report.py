@@ -0,0 +1,138 @@
+import re
+
+from . import engine, formatter, tracing
+
+# ==========================================
+# INTEGRITY REPORT
+# ==========================================
+# The text served by /download/report. Besides both hashes, it compares the
+# manuscript paragraph by paragraph (engine.compare_paragraphs) and lists
+# every passage whose meaning drifted below NOVA_DRIFT_THRESHOLD.
+#
+# Both sides are compared region by region: the prepared body (everything
+# from the first section on, as the PDF and DOCX get it) paragraph against
+# paragraph, and each header field the exports print from metadata (title,
+# authors, abstract) against the closest line of the original front matter.
+# Other front-matter lines — labels, affiliations, e-mails, keywords — are
+# replaced by the template and are not compared.
+
+_MARKER      = re.compile(r'@@(H[123]|FIG|TABLE|EQ)@@(.+)@@END@@')
+_INLINE_MATH = re.compile(r'@@M@@(.+?)@@END@@')
+
+EXCERPT_CHARS = 300
+
+
+def paragraphs(text: str) -> list:
+    """Non-empty paragraphs of extracted text, with the @@...@@ markers reduced to their text."""
+    out = []
+    for line in text.split('\n'):
+        line = line.strip()
+        if not line:
+            continue
+        m = _MARKER.fullmatch(line)
+        if m:
+            kind, line = m.groups()
+            if kind == 'FIG':
+                continue            # images carry no text to compare
+            if kind == 'TABLE':
+                rows = formatter.table_rows(line)
+                if rows is not None:
+                    line = ' / '.join(' | '.join(str(c) for c in row) for row in rows)
+        out.append(_INLINE_MATH.sub(r'\1', line))
+    return out
+
+
+def _header(metadata) -> list:
+    """[(field, text)] for the header fields the exports print from metadata."""
+    fields = [(k, (metadata.get(k, '') or '').strip()) for k in ('title', 'authors', 'abstract')]
+    return [(k, v) for k, v in fields if v]
+
+
+def body_paragraphs(metadata, text, extra_references=False):
+    """(front-matter paragraphs, body paragraphs) of `text` as the exports split it."""
+    preamble, body = formatter.split_preamble(metadata, text)
+    out = paragraphs(body)
+    refs = metadata.get('references', '') or ''
+    if extra_references and refs and refs != engine.NO_REFERENCES and refs not in text:
+        out += paragraphs(refs)     # added by the exporters when missing from the body
+    return paragraphs(preamble), out
+
+
+def _squash(text: str) -> str:
+    return ' '.join(text.lower().split())
+
+
+def _excerpt(text: str) -> str:
+    return text if len(text) <= EXCERPT_CHARS else text[:EXCERPT_CHARS].rstrip() + '…'
+
+
+@tracing.traced("report.build_report")
+def build_report(metadata, raw_text, original_text=None) -> str:
+    """
+    Plain-text integrity report. `original_text` defaults to `raw_text`
+    (the upload); pass it explicitly when `raw_text` itself was edited.
+    """
+    lex_hash = engine.calculate_lexical_hash(raw_text)
+    sem_hash = engine.get_semantic_hash(raw_text)
+
+    orig_front, original = body_paragraphs(metadata, original_text if original_text is not None else raw_text)
+    _,          final    = body_paragraphs(metadata, raw_text, extra_references=True)
+    header   = _header(metadata)
+    result   = engine.compare_paragraphs(original, final)
+    # A header field found verbatim in the front matter (authors are often one
+    # line with the affiliation) is unchanged; the rest are compared against
+    # their closest front-matter line. Lines nothing points at are the ones
+    # the template replaces.
+    front_text = _squash(' '.join(orig_front))
+    edited     = [(k, v) for k, v in header if _squash(v) not in front_text]
+    front      = engine.compare_paragraphs([v for _, v in edited], orig_front) if edited and orig_front else None
+
+    threshold = engine.DRIFT_THRESHOLD
+    # (label, similarity, original text, final text)
+    drifted = [(edited[i][0], sim, orig_front[j] if j is not None else None, edited[i][1])
+               for i, j, sim in (front["drifted"] if front else [])]
+    drifted += [(f"¶{i + 1}", sim, original[i], final[j] if j is not None else None)
+                for i, j, sim in result["drifted"]]
+    added     = result["added"]
+    unchanged = sum(1 for p in result["pairs"] if p[2] >= 1.0)
+
+    lines = [
+        "N.O.V.A. CRYPTOGRAPHIC INTEGRITY REPORT",
+        "---------------------------------------",
+        f"Document Title: {metadata.get('title', 'Unknown')}",
+        "",
+        "[ LEXICAL INTEGRITY ]",
+        f"SHA-256 Hash: {lex_hash}",
+        "",
+        "[ SEMANTIC INTEGRITY ]",
+        f"LSH Binarized Hash: {sem_hash}",
+        "",
+        "[ PARAGRAPH VERIFICATION ]",
+        f"Paragraphs: {len(original)} original, {len(final)} final",
+        f"Header fields: {len(header)}",
+        f"Unchanged: {unchanged}   Reworded: {len(original) - unchanged - len(result['drifted'])}   "
+        f"Drifted: {len(drifted)}   Added: {len(added)}",
+        f"Mean similarity: {result['similarity'] * 100:.1f}%   (threshold {threshold * 100:.0f}%)",
+    ]
+
+    if drifted:
+        lines += ["", "Drifted passages (original → closest final paragraph):"]
+        for label, sim, orig, fin in drifted:
+            lines += [
+                "",
+                f"  {label}  similarity {sim * 100:.1f}%",
+                f"    Original: {_excerpt(orig) if orig is not None else '(none)'}",
+                f"    Final:    {_excerpt(fin) if fin is not None else '(removed)'}",
+            ]
+    if added:
+        lines += ["", "Added passages with no counterpart in the original:"]
+        for j, sim in added:
+            lines += ["", f"  ¶{j + 1}  closest original {sim * 100:.1f}%", f"    Final:    {_excerpt(final[j])}"]
+
+    lines.append("")
+    if drifted or added:
+        lines.append(f"Verification: REVIEW REQUIRED — {len(drifted)} drifted and {len(added)} added "
+                     f"passage(s) below {threshold * 100:.0f}% similarity.")
+    else:
+        lines.append(f"Verification: all {len(original)} passages at or above {threshold * 100:.0f}% similarity.")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,206 @@
+import os
+import time
+import bisect
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# ==========================================
+# STAGE TRACING & METRICS
+# ==========================================
+# Lightweight timing spans around engine/formatter stages, aggregated into
+# Prometheus-style histograms and counters (served by main.py at /metrics).
+#
+# NOVA_TRACING=0 turns everything off — span() then hands back a shared no-op
+# context manager and traced() calls straight through, so the only cost left
+# is one global lookup per call.
+
+ENABLED = os.environ.get("NOVA_TRACING", "1").strip().lower() not in ("0", "false", "no", "off")
+
+# Seconds. Covers sub-millisecond string work up to multi-minute LLM/pdflatex calls.
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_lock = threading.Lock()
+
+
+class _Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)   # last slot is +Inf
+        self.total  = 0.0
+        self.count  = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+_stage_hist   = {}   # stage → _Histogram
+_queue_hist   = {}   # stage → _Histogram (time spent waiting for a worker thread)
+_http_hist    = {}   # (method, route, status) → _Histogram
+_cache_counts = {}   # (cache, "hit"|"miss") → int
+_errors       = {}   # stage → int
+
+# Spans recorded during the current HTTP request, for the Server-Timing header.
+# Holds a list (or None when nobody is collecting). asyncio.to_thread copies
+# the context, so worker threads append to the same list.
+_request_spans = contextvars.ContextVar("nova_request_spans", default=None)
+
+
+def _observe(table, key, value):
+    with _lock:
+        hist = table.get(key)
+        if hist is None:
+            hist = table[key] = _Histogram()
+        hist.observe(value)
+
+def _record_span(name, elapsed, failed=False):
+    _observe(_stage_hist, name, elapsed)
+    if failed:
+        with _lock:
+            _errors[name] = _errors.get(name, 0) + 1
+    spans = _request_spans.get()
+    if spans is not None:
+        spans.append((name, elapsed))
+
+
+# ── Public API ─────────────────────────────────────────────────────────────────
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+    def __exit__(self, *exc):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+@contextmanager
+def _span(name):
+    t0 = time.perf_counter()
+    failed = True
+    try:
+        yield
+        failed = False
+    finally:
+        _record_span(name, time.perf_counter() - t0, failed)
+
+def span(name):
+    """Time a block: `with tracing.span("formatter.pdflatex"): ...`"""
+    return _span(name) if ENABLED else _NULL_SPAN
+
+
+def traced(name):
+    """Decorator form of span() for whole functions."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return fn(*args, **kwargs)
+            t0 = time.perf_counter()
+            failed = True
+            try:
+                result = fn(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                _record_span(name, time.perf_counter() - t0, failed)
+        return wrapper
+    return decorator
+
+
+def record_cache(cache, hit):
+    """Count a cache lookup so /metrics can report hit rates."""
+    if not ENABLED:
+        return
+    key = (cache, "hit" if hit else "miss")
+    with _lock:
+        _cache_counts[key] = _cache_counts.get(key, 0) + 1
+
+def record_queue_wait(stage, seconds):
+    """Time between handing work to the thread pool and a worker picking it up."""
+    if not ENABLED:
+        return
+    _observe(_queue_hist, stage, seconds)
+    spans = _request_spans.get()
+    if spans is not None:
+        spans.append((f"{stage}.queue", seconds))
+
+def record_http(method, route, status, seconds):
+    if not ENABLED:
+        return
+    _observe(_http_hist, (method, route, str(status)), seconds)
+
+
+def start_request():
+    """Begin collecting spans for this request. Returns a token for end_request()."""
+    return _request_spans.set([])
+
+def end_request(token):
+    """Stop collecting and return the (name, seconds) spans seen during the request."""
+    spans = _request_spans.get() or []
+    _request_spans.reset(token)
+    return spans
+
+def server_timing(spans):
+    """Format spans as a Server-Timing header value (durations in ms, repeated stages summed)."""
+    totals = {}
+    for name, seconds in spans:
+        totals[name] = totals.get(name, 0.0) + seconds
+    return ", ".join(f'{name.replace(".", "-").replace("/", "-")};dur={seconds * 1000:.2f}'
+                     for name, seconds in totals.items())
+
+
+# ── Prometheus exposition ──────────────────────────────────────────────────────
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _label_str(labels):
+    return ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+
+def _histogram_lines(metric, table, label_names):
+    lines = []
+    for key, hist in sorted(table.items()):
+        values = key if isinstance(key, tuple) else (key,)
+        labels = list(zip(label_names, values))
+        cumulative = 0
+        for bound, n in zip(BUCKETS + (float("inf"),), hist.counts):
+            cumulative += n
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f"{metric}_bucket{{{_label_str(labels + [('le', le)])}}} {cumulative}")
+        lines.append(f"{metric}_sum{{{_label_str(labels)}}} {hist.total:.6f}")
+        lines.append(f"{metric}_count{{{_label_str(labels)}}} {hist.count}")
+    return lines
+
+def render_prometheus() -> str:
+    """All collected metrics in Prometheus text exposition format (version 0.0.4)."""
+    with _lock:
+        out = [
+            "# HELP nova_stage_duration_seconds Time spent in each engine/formatter stage.",
+            "# TYPE nova_stage_duration_seconds histogram",
+            *_histogram_lines("nova_stage_duration_seconds", _stage_hist, ("stage",)),
+            "# HELP nova_stage_errors_total Stage invocations that raised.",
+            "# TYPE nova_stage_errors_total counter",
+            *(f'nova_stage_errors_total{{{_label_str([("stage", s)])}}} {n}' for s, n in sorted(_errors.items())),
+            "# HELP nova_thread_queue_wait_seconds Time blocking work waited for a thread-pool slot.",
+            "# TYPE nova_thread_queue_wait_seconds histogram",
+            *_histogram_lines("nova_thread_queue_wait_seconds", _queue_hist, ("stage",)),
+            "# HELP nova_http_request_duration_seconds End-to-end HTTP request latency.",
+            "# TYPE nova_http_request_duration_seconds histogram",
+            *_histogram_lines("nova_http_request_duration_seconds", _http_hist, ("method", "route", "status")),
+            "# HELP nova_cache_requests_total Cache lookups by result.",
+            "# TYPE nova_cache_requests_total counter",
+            *(f'nova_cache_requests_total{{{_label_str([("cache", c), ("result", r)])}}} {n}'
+              for (c, r), n in sorted(_cache_counts.items())),
+        ]
+    return "\n".join(out) + "\n"
+
+
+def reset():
+    """Clear all collected metrics."""
+    with _lock:
+        for table in (_stage_hist, _queue_hist, _http_hist, _cache_counts, _errors):
+            table.clear()